@@ -1,56 +1,150 @@
 import pandas as pd
+import numpy as np
 import openpyxl
-from openpyxl.utils import get_column_letter
-from openpyxl.worksheet.table import Table, TableStyleInfo
 from openpyxl import Workbook, load_workbook
 import logging
 from datetime import datetime
 import streamlit as st
-from io import BytesIO
 import base64
+import os
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from cache_resultats import ResultCache, content_hash, TAILLE_PAR_DEFAUT, TTL_PAR_DEFAUT
+from export_arrow import create_columnar_archive, replace_table
+from export_excel import create_excel_with_tables, replace_sheet
+from incremental import diff_reports, id_number, merge_report_rows, rows_in, source_lines, stabilize_ids, updated_keys
+from instrumentation import Profiler
+from ingestion import COLONNES_POWERAPP, ColumnarArchive, open_tables, read_powerapp, read_source
+from pipeline import Stage, run_dag
+from recherche import DictionaryIndex, MODES_RECHERCHE
+from similarite import MinHashIndex, SEUIL_MINIMAL, SEUIL_PAR_DEFAUT, TAILLE_INDEX_PAR_DEFAUT, process_similar_data
+from taches import JobManager, TACHES_PAR_DEFAUT, TTL_TACHES_PAR_DEFAUT
+from validation import Probleme, validate_inputs, validate_transformed
 
 def setup_logging():
     log_filename = f"etl_log_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
     logging.basicConfig(filename=log_filename, level=logging.INFO,
                         format='%(asctime)s - %(levelname)s - %(message)s')
 
-def process_table_data(df_powerapp, df_source):
-    logging.info("Début du traitement de la table DATA")
-
-    # Combiner les colonnes 'KPI' et 'Maille d'analyse' du df_source pour obtenir toutes les DATA possibles
-    df_source['KPI'] = df_source['KPI'].astype(str).fillna('')
-    df_source["Maille d'analyse"] = df_source["Maille d'analyse"].astype(str).fillna('')
-
-    # Fonction pour extraire les valeurs uniques de KPI et Maille d'analyse
-    def extract_unique_data(series):
-        return set(
-            i.strip().lower()
-            for items in series
-            for i in items.split(',')
-            if i.strip()
-        )
-
-    kpi_data = extract_unique_data(df_source['KPI'])
-    maille_data = extract_unique_data(df_source["Maille d'analyse"])
-
-    # Créer un DataFrame avec toutes les DATA possibles du fichier source
-    all_data = pd.DataFrame({
-        'DATA': list(kpi_data.union(maille_data))
+COLONNES_DATA_SOURCE = {'KPI': 'KPI', "Maille d'analyse": "Maille d'analyse"}
+TYPES_DATA = ['KPI', "Maille d'analyse", 'Non spécifié']
+
+# Formats du fichier transformé : libellé, extension et type MIME du téléchargement
+FORMATS_EXPORT = {
+    'xlsx': ("Excel (.xlsx)", 'xlsx', "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    'parquet': ("Parquet (archive .zip)", 'zip', "application/zip"),
+    'arrow': ("Arrow IPC (archive .zip)", 'zip', "application/zip"),
+}
+
+LIBELLES_RECHERCHE = {'prefixe': "Commence par", 'contient': "Contient"}
+
+# Part maximale de valeurs distinctes pour qu'une colonne texte soit stockée en catégorie
+SEUIL_CATEGORIE = 0.5
+
+def factorize_labels(valeurs):
+    # Codes entiers et libellés distincts, dans l'ordre d'apparition ; des libellés tous textuels
+    # sont stockés en chaînes Arrow plutôt qu'en objets Python
+    codes, libelles = pd.factorize(valeurs)
+    return codes, libelles.infer_objects()
+
+def compact_frame(df, colonnes=None, seuil=SEUIL_CATEGORIE):
+    # Colonnes texte répétitives converties en catégories : un code entier par ligne,
+    # chaque libellé n'est stocké qu'une fois
+    colonnes = df.columns if colonnes is None else [colonne for colonne in colonnes if colonne in df.columns]
+    conversions = {}
+    for colonne in colonnes:
+        dtype = df[colonne].dtype
+        if isinstance(dtype, pd.CategoricalDtype) or not (pd.api.types.is_object_dtype(dtype) or pd.api.types.is_string_dtype(dtype)):
+            continue
+        codes, valeurs = factorize_labels(df[colonne])
+        if len(df) and len(valeurs) <= seuil * len(df):
+            conversions[colonne] = pd.Categorical.from_codes(codes, valeurs)
+    return df.assign(**conversions) if conversions else df
+
+def left_join(df_gauche, df_droite, cle):
+    # Équivalent de pd.merge(df_gauche, df_droite, on=cle, how='left') quand `cle` est unique dans df_droite :
+    # les lignes de df_droite sont retrouvées par position à partir de clés entières (codes de catégorie),
+    # et les colonnes de df_gauche sont reprises sans être recopiées
+    droite = pd.Index(df_droite[cle])
+    colonnes = df_droite.columns.drop(cle)
+    if not droite.is_unique or colonnes.isin(df_gauche.columns).any():
+        return pd.merge(df_gauche, df_droite, on=cle, how='left')
+
+    valeurs = df_gauche[cle]
+    if isinstance(valeurs.dtype, pd.CategoricalDtype):
+        # Une recherche par libellé distinct, puis un simple indiçage par code (NaN : code -1, dernière case)
+        positions_categories = np.append(droite.get_indexer(valeurs.cat.categories), droite.get_indexer([np.nan]))
+        positions = positions_categories[valeurs.cat.codes.to_numpy()]
+    else:
+        positions = droite.get_indexer(valeurs)
+
+    ajouts = df_droite[colonnes].reset_index(drop=True).reindex(positions).reset_index(drop=True)
+    return pd.concat([df_gauche.reset_index(drop=True), ajouts], axis=1)
+
+def _decouper(valeurs):
+    # Listes séparées par des virgules -> (ligne de chaque jeton, jetons) : strip, minuscules, vides ignorés.
+    # Le découpage reste en mémoire Arrow, sans objet Python par jeton.
+    valeurs = valeurs[valeurs.notna()].astype(str)
+    listes = pc.split_pattern(pa.array(valeurs, type=pa.large_string()), ',')
+    tokens = pc.utf8_lower(pc.utf8_trim_whitespace(pc.list_flatten(listes)))
+    non_vides = pc.not_equal(tokens, '')
+    lignes = valeurs.index.to_numpy()[pc.filter(pc.list_parent_indices(listes), non_vides).to_numpy()]
+    return lignes, pc.filter(tokens, non_vides)
+
+def tokenize_kpi_maille(df_source):
+    # Découpage unique des listes 'KPI' et 'Maille d'analyse' en table longue
+    # (ligne, rapport, DATA, Type) : strip, minuscules, valeurs vides et NaN ignorées.
+    # 'Nom du rapport', 'DATA' et 'Type' sont des catégories : la table compte plusieurs jetons par ligne source.
+    lignes, ordres, tokens = [], [], []
+    for ordre, colonne in enumerate(COLONNES_DATA_SOURCE):
+        lignes_colonne, tokens_colonne = _decouper(df_source[colonne].reset_index(drop=True))
+        lignes.append(lignes_colonne)
+        ordres.append(np.full(len(lignes_colonne), ordre, dtype=np.int8))
+        tokens.append(tokens_colonne)
+    lignes, ordres = np.concatenate(lignes), np.concatenate(ordres)
+
+    # Pour chaque ligne du source : les KPI d'abord, puis les mailles, dans l'ordre de saisie
+    permutation = np.lexsort((ordres, lignes))
+    data = pc.dictionary_encode(pc.take(pa.chunked_array(tokens), permutation)).to_pandas()
+    lignes = lignes[permutation]
+    codes_rapport, rapports = factorize_labels(df_source['Nom du rapport'])
+
+    return pd.DataFrame({
+        'ligne': lignes,
+        'Nom du rapport': pd.Categorical.from_codes(codes_rapport[lignes], rapports),
+        'DATA': pd.Categorical(data),
+        'Type': pd.Categorical.from_codes(ordres[permutation], categories=list(COLONNES_DATA_SOURCE.values())),
     })
 
-    # Nettoyage de la colonne 'DATA' dans df_powerapp
-    df_powerapp['DATA'] = df_powerapp['DATA'].astype(str).str.strip().str.lower()
+def join_powerapp(df_powerapp, data):
+    # Créer un DataFrame avec les DATA demandées
+    all_data = pd.DataFrame({'DATA': data})
 
     # Sélection des colonnes à conserver de df_powerapp
-    columns_to_keep = ["Descriptif de la donnée", "DATA", "Qualité", "Règles de calcul KPI",
-                       "Descriptif KPI", "Lien Wiki", "Famille donnée"]
-    dftest = df_powerapp[[col for col in columns_to_keep if col in df_powerapp.columns]].copy()
+    dftest = df_powerapp[[col for col in COLONNES_POWERAPP if col in df_powerapp.columns]].copy()
 
     # Nettoyage de la colonne 'DATA' dans dftest
     dftest['DATA'] = dftest['DATA'].astype(str).str.strip().str.lower()
 
     # Fusionner les données pour obtenir toutes les DATA avec leurs informations
-    dftest = pd.merge(all_data, dftest, on='DATA', how='left')
+    return pd.merge(all_data, dftest, on='DATA', how='left')
+
+def process_table_data(df_powerapp, df_source, df_tokens=None):
+    logging.info("Début du traitement de la table DATA")
+
+    # Combiner les colonnes 'KPI' et 'Maille d'analyse' du df_source pour obtenir toutes les DATA possibles
+    if df_tokens is None:
+        df_tokens = tokenize_kpi_maille(df_source)
+
+    # Valeurs uniques de KPI et Maille d'analyse
+    kpi_uniques = pd.Index(np.asarray(df_tokens.loc[df_tokens['Type'] == 'KPI', 'DATA'].unique()))
+    maille_uniques = pd.Index(np.asarray(df_tokens.loc[df_tokens['Type'] == "Maille d'analyse", 'DATA'].unique()))
+    kpi_data = set(kpi_uniques)
+    maille_data = set(maille_uniques)
+
+    # Toutes les DATA possibles du fichier source, avec leurs informations du Powerapp
+    dftest = join_powerapp(df_powerapp, list(kpi_data.union(maille_data)))
 
     # Attribuer un ID_DATA unique à chaque DATA
     dftest.reset_index(drop=True, inplace=True)
@@ -59,130 +153,140 @@ def process_table_data(df_powerapp, df_source):
     dftest.drop('id', axis=1, inplace=True)
 
     # Déterminer le Type (KPI ou Maille d'analyse)
-    dftest['Type'] = dftest['DATA'].apply(
-        lambda x: 'KPI' if x in kpi_data else ('Maille d\'analyse' if x in maille_data else 'Non spécifié')
-    )
+    est_kpi = kpi_uniques.get_indexer(dftest['DATA']) >= 0
+    est_maille = maille_uniques.get_indexer(dftest['DATA']) >= 0
+    dftest['Type'] = pd.Categorical.from_codes(np.where(est_kpi, 0, np.where(est_maille, 1, 2)), categories=TYPES_DATA)
+    dftest = compact_frame(dftest, ['Qualité', 'Famille donnée'])
 
     logging.info("Fin du traitement de la table DATA")
     return dftest
 
+def initiales_po_data(phrase):
+    words = phrase.split()
+    return ''.join([word[0].upper() for word in words])
+
+def generate_id_po_data(phrase, counter):
+    initials = initiales_po_data(phrase)
+    id_number = f"{counter:04d}"
+    unique_id = initials + id_number
+    return unique_id
+
 def process_po_data(df_source):
     logging.info("Début du traitement de la table PO DATA")
     df2 = df_source[['PO Data']].copy()
     df_drop = df2.drop_duplicates().reset_index(drop=True)
 
-    def generate_id(phrase, counter):
-        logging.info("Début du traitement des ID de la table PO DATA")
-        words = phrase.split()
-        initials = ''.join([word[0].upper() for word in words])
-        id_number = f"{counter:04d}"
-        unique_id = initials + id_number
-        return unique_id
-
-    df_drop['ID_PO_DATA'] = [generate_id(row, i+1) for i, row in enumerate(df_drop['PO Data'])]
+    df_drop['ID_PO_DATA'] = [generate_id_po_data(row, i+1) for i, row in enumerate(df_drop['PO Data'])]
     df_drop.columns = df_drop.columns.map(str)
 
     logging.info("Fin du traitement de la table PO DATA")
     return df_drop
 
-def process_prompt_data(df_source):
-    df2 = df_source[['Ecran de sélection /prompt ']].copy()
-
-    split_data = df2['Ecran de sélection /prompt '].str.split(',', expand=True)
-    split_data.columns = [f'Colonne{i+1}' for i in range(split_data.shape[1])]
-    df3 = pd.concat([df2, split_data], axis=1)
-
-    id_vars = ["Ecran de sélection /prompt "]
-    df_unpivot = pd.melt(df3, id_vars=id_vars, var_name="Colonne", value_name="Valeur")
-
-    df4 = df_unpivot.dropna(subset=['Valeur']).copy()
-    df4['Valeur'] = df4['Valeur'].str.lower()
-    df4 = df4.drop_duplicates(subset=['Valeur']).reset_index(drop=True)
-
-    df4 = df4[["Ecran de sélection /prompt ", 'Valeur']].copy()
-
-    df4['id'] = df4.index + 1
-    df4.insert(0, 'ID_PROMPT', 'PROMPT' + df4['id'].astype(str).str.zfill(4))
-    df4.drop('id', axis=1, inplace=True)
+COLONNE_PROMPT = 'Ecran de sélection /prompt '
+
+def tokenize_prompts(df_source):
+    # Découpage unique de la colonne des prompts en table longue (ligne, Colonne, Prompt), une ligne par prompt
+    # saisi : la mémoire suit le nombre de prompts et non lignes x plus longue liste. Comme l'ancien
+    # split(expand=True) + melt : tous les 1ers prompts, puis tous les 2es, etc. ; minuscules, sans strip,
+    # jetons vides conservés, cellules non textuelles ignorées.
+    valeurs = df_source[COLONNE_PROMPT].reset_index(drop=True)
+    valeurs = valeurs[valeurs.notna()]
+    if pd.api.types.is_object_dtype(valeurs.dtype):
+        valeurs = valeurs[valeurs.map(lambda valeur: isinstance(valeur, str))]
+
+    listes = pc.split_pattern(pa.array(valeurs.astype(str), type=pa.large_string()), ',')
+    longueurs = pc.list_value_length(listes).to_numpy()
+    lignes = np.repeat(valeurs.index.to_numpy(), longueurs)
+    positions = np.arange(len(lignes)) - np.repeat(np.cumsum(longueurs) - longueurs, longueurs)
+    prompts = pc.utf8_lower(pc.list_flatten(listes))
+
+    ordre = np.lexsort((lignes, positions))
+    prompts = pd.Categorical(pc.dictionary_encode(pc.take(prompts, ordre)).to_pandas())
+    positions = positions[ordre]
+    noms_colonnes = [f'Colonne{i + 1}' for i in range(positions.max() + 1 if len(positions) else 0)]
+
+    return pd.DataFrame({
+        'ligne': lignes[ordre],
+        'Colonne': pd.Categorical.from_codes(positions, noms_colonnes),
+        'Prompt': prompts,
+    })
 
-    df4.rename(columns={'Valeur': 'Prompt'}, inplace=True)
-    df5 = df4[['ID_PROMPT', 'Prompt']].copy()
+def process_prompt_data(df_source, df_prompts=None):
+    if df_prompts is None:
+        df_prompts = tokenize_prompts(df_source)
 
-    df5.columns = df5.columns.map(str)
+    # Un ID_PROMPT par prompt distinct, dans l'ordre de première apparition
+    df5 = df_prompts[['Prompt']].drop_duplicates().astype(str).reset_index(drop=True)
+    df5.insert(0, 'ID_PROMPT', 'PROMPT' + (df5.index + 1).astype(str).str.zfill(4))
 
     return df5
 
-def process_rapport_prompt(df5, df_source):
-    df_Rapport_Prompt = df_source[["Nom du rapport", 'Ecran de sélection /prompt ']].copy()
-
-    split_data = df_Rapport_Prompt['Ecran de sélection /prompt '].str.split(',', expand=True)
-    split_data.columns = [f'Colonne{i+1}' for i in range(split_data.shape[1])]
-    df_Rapport_Prompt2 = pd.concat([df_Rapport_Prompt, split_data], axis=1)
-
-    id_vars = ["Nom du rapport", "Ecran de sélection /prompt "]
-    df_unpivot = pd.melt(df_Rapport_Prompt2, id_vars=id_vars, var_name="Colonne", value_name="Valeur")
-
-    df_Rapport_Prompt3 = df_unpivot.dropna(subset=['Valeur']).copy()
-    df_Rapport_Prompt3['Valeur'] = df_Rapport_Prompt3['Valeur'].str.lower()
-    df_Rapport_Prompt3.rename(columns={'Valeur': 'Prompt'}, inplace=True)
-
-    merged_df_Prompt = pd.merge(df_Rapport_Prompt3, df5, on='Prompt')
+def process_rapport_prompt(df5, df_source, df_prompts=None):
+    if df_prompts is None:
+        df_prompts = tokenize_prompts(df_source)
+
+    # Une ligne par prompt de chaque rapport ; rapport et liste saisie repris par code de catégorie
+    lignes = df_prompts['ligne'].to_numpy()
+    codes_rapport, rapports = factorize_labels(df_source['Nom du rapport'])
+    codes_ecran, ecrans = factorize_labels(df_source[COLONNE_PROMPT])
+    df_Rapport_Prompt = pd.DataFrame({
+        'Nom du rapport': pd.Categorical.from_codes(codes_rapport[lignes], rapports),
+        COLONNE_PROMPT: pd.Categorical.from_codes(codes_ecran[lignes], ecrans),
+        'Colonne': df_prompts['Colonne'].array,
+        'Prompt': df_prompts['Prompt'].array,
+    })
 
-    return merged_df_Prompt
+    # Seuls les prompts présents dans df5 sont conservés (jointure interne)
+    merged_df_Prompt = left_join(df_Rapport_Prompt, df5, 'Prompt')
+    merged_df_Prompt = merged_df_Prompt[merged_df_Prompt['ID_PROMPT'].notna()].reset_index(drop=True)
+
+    return compact_frame(merged_df_Prompt, ['ID_PROMPT'])
+
+TABLE_SUPPRESSION_ID_RAPPORT = str.maketrans("", "", "-_?/()–")
+MOTS_IGNORES_ID_RAPPORT = {"en", "par", "et", "des", "a"}
+
+def initiales_rapport(texte_original):
+    texte_nettoye = texte_original.translate(TABLE_SUPPRESSION_ID_RAPPORT)
+    mots = texte_nettoye.split()
+    mots_filtres = [mot for mot in mots if mot.lower() not in MOTS_IGNORES_ID_RAPPORT]
+    premieres_lettres = [mot[0].upper() for mot in mots_filtres]
+    id_partiel = ''.join(premieres_lettres)
+    return id_partiel[:3]
+
+def generer_ids_rapport(noms_rapport):
+    # Index de première occurrence de chaque rapport, construit en une seule passe :
+    # les initiales ne sont calculées qu'une fois par nom de rapport
+    premieres_occurrences = noms_rapport[~noms_rapport.duplicated()]
+    ids_par_rapport = {
+        nom: initiales_rapport(nom) + str(index + 1).zfill(4)
+        for index, nom in premieres_occurrences.items()
+    }
+    return noms_rapport.map(ids_par_rapport)
 
-def process_rapport_data(merged_df_Prompt, df_source):
-    df_Rapport = df_source
+def process_rapport_data(df_source):
+    df_Rapport = df_source.copy()
+    for colonne in COLONNES_DATA_SOURCE:
+        df_Rapport[colonne] = df_Rapport[colonne].fillna('').astype(str)
     df_Rapport['DATA_detail'] = df_Rapport["KPI"] + ',' + df_Rapport["Maille d'analyse"]
     
-    def generer_id(texte_original, index):
-        texte_nettoye = texte_original.translate(str.maketrans("", "", "-_?/()–"))
-        mots = texte_nettoye.split()
-        mots_filtres = [mot for mot in mots if mot.lower() not in {"en", "par", "et", "des", "a"}]
-        premieres_lettres = [mot[0].upper() for mot in mots_filtres]
-        id_partiel = ''.join(premieres_lettres)
-        id_sans_numero = id_partiel[:3]
-        id_complet = id_sans_numero + str(index).zfill(4)
-        return id_complet
-    
-    df_Rapport.insert(0, 'ID_RAPPORT', df_Rapport['Nom du rapport'].apply(lambda x: generer_id(x, df_Rapport.index[df_Rapport['Nom du rapport'] == x].tolist()[0] + 1)))
-    
-    merged_df_Prompt2 = pd.merge(merged_df_Prompt, df_Rapport, on='Nom du rapport')
-    df_Rapport_Prompt = merged_df_Prompt2[["Nom du rapport", "Prompt", "ID_PROMPT", "ID_RAPPORT"]]
-    
-    df_Rapport_Prompt.columns = df_Rapport_Prompt.columns.map(str)
+    df_Rapport.insert(0, 'ID_RAPPORT', generer_ids_rapport(df_Rapport['Nom du rapport']))
     
     return df_Rapport
 
-def process_rapport_data_2(df_Rapport, df_data):
-    df_rapport_data = df_Rapport.copy()
-
-    df_rapport_data['KPI'] = df_rapport_data['KPI'].astype(str).fillna('')
-    df_rapport_data['Maille d\'analyse'] = df_rapport_data['Maille d\'analyse'].astype(str).fillna('')
+def process_rapport_data_2(df_Rapport, df_data, df_tokens=None):
+    if df_tokens is None:
+        df_tokens = tokenize_kpi_maille(df_Rapport)
 
-    df_rapport_data['KPI_list'] = df_rapport_data['KPI'].str.split(',')
-    df_rapport_data['Maille_list'] = df_rapport_data['Maille d\'analyse'].str.split(',')
+    # Une ligne par couple (rapport, DATA), rattachée à l'ID_RAPPORT de sa ligne source
+    df_rapport_data_exploded = df_tokens[['Nom du rapport', 'DATA']].copy()
+    codes_rapport, ids_rapport = factorize_labels(df_Rapport['ID_RAPPORT'])
+    df_rapport_data_exploded.insert(1, 'ID_RAPPORT', pd.Categorical.from_codes(codes_rapport[df_tokens['ligne'].to_numpy()], ids_rapport))
 
-    # Nettoyage des listes
-    df_rapport_data['KPI_list'] = df_rapport_data['KPI_list'].apply(lambda x: [i.strip().lower() for i in x if i.strip()])
-    df_rapport_data['Maille_list'] = df_rapport_data['Maille_list'].apply(lambda x: [i.strip().lower() for i in x if i.strip()])
+    # Nettoyage de df_data (sur une copie : df_data est aussi la table DATA exportée)
+    df_data = df_data.assign(DATA=df_data['DATA'].astype(str).str.strip().str.lower())
 
-    df_rapport_data['DATA_list'] = df_rapport_data['KPI_list'] + df_rapport_data['Maille_list']
-
-    df_rapport_data_exploded = df_rapport_data.explode('DATA_list')
-
-    df_rapport_data_exploded['DATA'] = df_rapport_data_exploded['DATA_list']
-
-    # Nettoyage de DATA
-    df_rapport_data_exploded['DATA'] = df_rapport_data_exploded['DATA'].str.strip().str.lower()
-
-    # Filtrage des valeurs non nulles
-    df_rapport_data_exploded = df_rapport_data_exploded[df_rapport_data_exploded['DATA'].notnull() & (df_rapport_data_exploded['DATA'] != '')]
-
-    # Nettoyage de df_data
-    df_data['DATA'] = df_data['DATA'].astype(str).str.strip().str.lower()
-
-    # Fusion des données
-    merged_df_rapport_data = pd.merge(df_rapport_data_exploded, df_data, on='DATA', how='left')
+    # Fusion des données, par les codes de catégorie de DATA
+    merged_df_rapport_data = left_join(df_rapport_data_exploded, df_data, 'DATA')
 
     # Vérification des DATA sans correspondance
     missing_id_data = merged_df_rapport_data[merged_df_rapport_data['ID_DATA'].isna()]
@@ -190,158 +294,466 @@ def process_rapport_data_2(df_Rapport, df_data):
         logging.warning("Les DATA suivants n'ont pas de correspondance dans df_data :")
         logging.warning(missing_id_data['DATA'].unique())
 
-    df_Rapport_data_final = merged_df_rapport_data[["Nom du rapport", "ID_RAPPORT", "ID_DATA", "DATA", "Type"]].copy()
+    df_Rapport_data_final = compact_frame(merged_df_rapport_data[["Nom du rapport", "ID_RAPPORT", "ID_DATA", "DATA", "Type"]].copy())
 
     df_Rapport_data_final.columns = df_Rapport_data_final.columns.map(str)
 
     return df_Rapport_data_final
 
+def initiales_axe_temps(phrase):
+    words = phrase.split()
+    return ''.join([word[0].upper() for word in words[:3]])
+
+def generate_id_axe_temps(phrase, counter):
+    initials = initiales_axe_temps(phrase)
+    id_number = f"{counter:04d}"
+    unique_id = initials + id_number
+    return unique_id
+
 def process_axe_temps(df_source):
     df_Axe_Temps = df_source[['Axe temps du rapport']].drop_duplicates().reset_index(drop=True)
 
-    def generate_id(phrase, counter):
-        words = phrase.split()
-        initials = ''.join([word[0].upper() for word in words[:3]])
-        id_number = f"{counter:04d}"
-        unique_id = initials + id_number
-        return unique_id
-
-    df_Axe_Temps['ID_AXE_TEMPS'] = [generate_id(row, i+1) for i, row in enumerate(df_Axe_Temps['Axe temps du rapport'])]
+    df_Axe_Temps['ID_AXE_TEMPS'] = [generate_id_axe_temps(row, i+1) for i, row in enumerate(df_Axe_Temps['Axe temps du rapport'])]
 
     return df_Axe_Temps
 
 def process_rapport_part2(df_Rapport, df_Axe_Temps, df_po_data):
-    merged_Rapport = pd.merge(df_Rapport, df_po_data, on='PO Data', how='left')
-    merged_Rapport2 = pd.merge(merged_Rapport, df_Axe_Temps, on='Axe temps du rapport', how='left')
+    # Les colonnes de df_Rapport ne sont pas recopiées : seuls les identifiants sont ajoutés
+    merged_Rapport = left_join(df_Rapport, df_po_data, 'PO Data')
+    merged_Rapport2 = compact_frame(left_join(merged_Rapport, df_Axe_Temps, 'Axe temps du rapport'))
 
     merged_Rapport2.columns = merged_Rapport2.columns.map(str)
 
     return merged_Rapport2
 
 # code du type kpi ou maille d'analyse
-def process_kpi_and_maille(df_source):
-    def ensure_list(x):
-        if pd.isna(x):
-            return []
-        elif isinstance(x, list):
-            return x
-        elif isinstance(x, str):
-            return [i.strip().lower() for i in x.split(',') if i.strip()]
-        else:
-            return [str(x)]
+def process_kpi_and_maille(df_source, df_tokens=None):
+    if df_tokens is None:
+        df_tokens = tokenize_kpi_maille(df_source)
 
-    kpi_series = df_source['KPI'].apply(ensure_list)
-    maille_series = df_source["Maille d'analyse"].apply(ensure_list)
+    # Tous les KPI, puis toutes les mailles d'analyse
+    df_final = pd.concat([
+        df_tokens.loc[df_tokens['Type'] == type_data, ['DATA', 'Type']]
+        for type_data in COLONNES_DATA_SOURCE.values()
+    ], ignore_index=True).drop_duplicates()
 
-    kpi_list = [(item, 'KPI') for sublist in kpi_series for item in sublist]
-    maille_list = [(item, "Maille d'analyse") for sublist in maille_series for item in sublist]
+    return df_final
 
-    combined_list = kpi_list + maille_list
-    df_final = pd.DataFrame(combined_list, columns=['DATA', 'Type']).drop_duplicates()
+@st.cache_resource
+def get_result_cache():
+    # Cache partagé par toutes les sessions du serveur, configurable par variables d'environnement
+    return ResultCache(
+        max_entries=int(os.environ.get('DICTIONNAIRE_CACHE_TAILLE', TAILLE_PAR_DEFAUT)),
+        ttl_seconds=int(os.environ.get('DICTIONNAIRE_CACHE_TTL', TTL_PAR_DEFAUT)),
+        directory=os.environ.get('DICTIONNAIRE_CACHE_DIR') or None,
+    )
 
-    return df_final
+@st.cache_resource
+def get_job_manager():
+    # Pool de tâches partagé par toutes les sessions : borne le nombre d'ETL simultanés sur le serveur
+    return JobManager(
+        max_workers=int(os.environ.get('DICTIONNAIRE_TACHES_MAX', TACHES_PAR_DEFAUT)),
+        ttl_seconds=int(os.environ.get('DICTIONNAIRE_TACHES_TTL', TTL_TACHES_PAR_DEFAUT)),
+    )
 
-def create_excel_with_tables(all_dataframes, filename='fichier_transforme.xlsx'):
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        # Écrire les DataFrames dans le fichier Excel
-        for sheet_name, df in all_dataframes.items():
-            df.to_excel(writer, sheet_name=sheet_name, index=False)
-        
-        # Accéder au classeur et ajouter les styles de tableau
-        workbook = writer.book
-        for sheet_name in all_dataframes.keys():
-            worksheet = workbook[sheet_name]
-            df = all_dataframes[sheet_name]
-            # Définir la plage de données (toutes les lignes et colonnes du DataFrame)
-            nb_rows = df.shape[0] + 1  # +1 pour l'en-tête
-            nb_cols = df.shape[1]
-            # Définir la plage de cellules à convertir en tableau
-            ref = f"A1:{get_column_letter(nb_cols)}{nb_rows}"
-            # Créer le tableau
-            table = Table(displayName=f"Table_{sheet_name}", ref=ref)
-            # Définir le style du tableau
-            style = TableStyleInfo(name="TableStyleMedium9", showFirstColumn=False,
-                                   showLastColumn=False, showRowStripes=True, showColumnStripes=False)
-            table.tableStyleInfo = style
-            # Ajouter le tableau à la feuille de calcul
-            worksheet.add_table(table)
-    output.seek(0)
-    return output
-
-def create_excel_with_tables_from_sheets(sheets, filename='Résultat_Données_Similaires.xlsx'):
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        # Écrire les DataFrames dans le fichier Excel
-        for sheet_name, df in sheets.items():
-            df.to_excel(writer, sheet_name=sheet_name, index=False)
-        
-        # Accéder au classeur et ajouter les styles de tableau
-        workbook = writer.book
-        for sheet_name in sheets.keys():
-            worksheet = workbook[sheet_name]
-            df = sheets[sheet_name]
-            # Définir la plage de données (toutes les lignes et colonnes du DataFrame)
-            nb_rows = df.shape[0] + 1  # +1 pour l'en-tête
-            nb_cols = df.shape[1]
-            # Définir la plage de cellules à convertir en tableau
-            ref = f"A1:{get_column_letter(nb_cols)}{nb_rows}"
-            # Créer le tableau
-            table = Table(displayName=f"Table_{sheet_name}", ref=ref)
-            # Définir le style du tableau
-            style = TableStyleInfo(name="TableStyleMedium9", showFirstColumn=False,
-                                   showLastColumn=False, showRowStripes=True, showColumnStripes=False)
-            table.tableStyleInfo = style
-            # Ajouter le tableau à la feuille de calcul
-            worksheet.add_table(table)
-    output.seek(0)
-    return output
-
-def main_etl(df_powerapp, df_source):
-    df_data = process_table_data(df_powerapp, df_source)
-    df_po_data = process_po_data(df_source)
-    df5 = process_prompt_data(df_source)
-    merged_df_Prompt = process_rapport_prompt(df5, df_source)
-    df_Rapport = process_rapport_data(merged_df_Prompt, df_source)
-    df_Rapport_data = process_rapport_data_2(df_Rapport, df_data)
-    df_Axe_Temps = process_axe_temps(df_source)
-    merged_Rapport2 = process_rapport_part2(df_Rapport, df_Axe_Temps, df_po_data)
+@st.cache_resource
+def get_similarity_index():
+    # Signatures MinHash partagées par toutes les sessions, bornées en nombre et persistées si un fichier .npz est configuré
+    return MinHashIndex(
+        path=os.environ.get('DICTIONNAIRE_SIMILARITE_INDEX') or None,
+        max_entries=int(os.environ.get('DICTIONNAIRE_SIMILARITE_INDEX_TAILLE', TAILLE_INDEX_PAR_DEFAUT)),
+    )
+
+def export_tables(tables, format='xlsx'):
+    # Contenu du fichier transformé : classeur Excel ou archive d'une table Parquet/Arrow par feuille
+    if format == 'xlsx':
+        return create_excel_with_tables(tables).getvalue()
+    return create_columnar_archive(tables, format=format).getvalue()
+
+def read_excel_cached(cache, contenu, empreinte, lecteur):
+    # Les DataFrames en cache sont partagés : on renvoie une copie modifiable
+    cle = ('lecture', lecteur.__name__, empreinte)
+    df = cache.get_or_compute(cle, lambda: lecteur(contenu))
+    return df.copy()
+
+# Graphe des traitements de l'ETL : chaque étape ne dépend que des résultats qu'elle déclare
+ETAPES_ETL = [
+    Stage('df_tokens', tokenize_kpi_maille, ['df_source']),
+    Stage('df_data', process_table_data, ['df_powerapp', 'df_source', 'df_tokens']),
+    Stage('df_po_data', process_po_data, ['df_source']),
+    Stage('df_prompts', tokenize_prompts, ['df_source']),
+    Stage('df5', process_prompt_data, ['df_source', 'df_prompts']),
+    Stage('merged_df_Prompt', process_rapport_prompt, ['df5', 'df_source', 'df_prompts']),
+    Stage('df_Rapport', process_rapport_data, ['df_source']),
+    Stage('df_Rapport_data', process_rapport_data_2, ['df_Rapport', 'df_data', 'df_tokens']),
+    Stage('df_Axe_Temps', process_axe_temps, ['df_source']),
+    Stage('merged_Rapport2', process_rapport_part2, ['df_Rapport', 'df_Axe_Temps', 'df_po_data']),
+]
+
+TABLES_ETL = {
+    'Table_DATA': 'df_data',
+    'Table_Prompt': 'df5',
+    'Table_PO_DATA': 'df_po_data',
+    'Table_Rapport_Prompt': 'merged_df_Prompt',
+    'Table_Rapport_Data': 'df_Rapport_data',
+    'Table_AxeTemps': 'df_Axe_Temps',
+    'Table_Rapport': 'merged_Rapport2'
+}
+
+def main_etl(df_powerapp, df_source, tables=None, max_workers=None, executor='thread', profiler=None, progress=None):
+    # Seules les étapes nécessaires aux tables demandées sont exécutées
+    tables = list(TABLES_ETL) if tables is None else tables
+    resultats = run_dag(
+        ETAPES_ETL,
+        {'df_powerapp': df_powerapp, 'df_source': df_source},
+        [TABLES_ETL[table] for table in tables],
+        max_workers=max_workers,
+        executor=executor,
+        profiler=profiler,
+        progress=progress,
+    )
+
+    all_dataframes = {table: resultats[TABLES_ETL[table]] for table in tables}
+
+    return all_dataframes
+
+# Tables de référence : clé métier, identifiant et préfixe des identifiants
+IDS_STABLES = {
+    'Table_DATA': ('DATA', 'ID_DATA', lambda cle: 'DATA'),
+    'Table_Prompt': ('Prompt', 'ID_PROMPT', lambda cle: 'PROMPT'),
+    'Table_PO_DATA': ('PO Data', 'ID_PO_DATA', initiales_po_data),
+    'Table_AxeTemps': ('Axe temps du rapport', 'ID_AXE_TEMPS', initiales_axe_temps),
+}
+
+# Colonnes dont les chaînes vides d'une exécution complète sont relues comme NaN depuis un classeur Excel
+COLONNES_VIDES_EXPORT = {
+    'Table_Rapport': list(COLONNES_DATA_SOURCE),
+    'Table_Rapport_Prompt': ['Prompt'],
+    'Table_Prompt': ['Prompt'],
+}
+
+def fill_empty_cells(df, colonnes):
+    # NaN -> '' dans les colonnes indiquées, comme dans le résultat de main_etl
+    conversions = {}
+    for colonne in colonnes:
+        if colonne not in df.columns or not df[colonne].hasnans:
+            continue
+        valeurs = df[colonne]
+        if isinstance(valeurs.dtype, pd.CategoricalDtype) and '' not in valeurs.cat.categories:
+            valeurs = valeurs.cat.add_categories([''])
+        conversions[colonne] = valeurs.fillna('')
+    return df.assign(**conversions) if conversions else df
+
+def update_reference_table(table, df_precedent, cles_reprises, cles_nouvelles):
+    # Clés encore utilisées, dans l'ordre et avec les identifiants de l'export précédent, puis nouvelles clés
+    colonne_cle, colonne_id, prefixe = IDS_STABLES[table]
+    conservees, ajoutees = updated_keys(df_precedent[colonne_cle], cles_reprises, cles_nouvelles)
+    cles = pd.concat([df_precedent[colonne_cle][conservees], pd.Series(ajoutees)], ignore_index=True)
+    df = stabilize_ids(pd.DataFrame({colonne_cle: cles}), colonne_cle, colonne_id, df_precedent, prefixe)
+    return df[list(df_precedent.columns)]
+
+def update_table_data(df_powerapp, df_precedent, data_reprises, df_tokens, kpi_retires, kpi_inchanges):
+    # Table DATA mise à jour à partir des seuls jetons des rapports recalculés ou supprimés, et nouveau type
+    # des DATA déjà connues dont le type change ; `kpi_inchanges()` ne découpe les KPI des rapports
+    # inchangés que si le type d'une DATA en dépend
+    conservees, ajoutees = updated_keys(df_precedent['DATA'], data_reprises, df_tokens['DATA'])
+    data = pd.concat([pd.Series(df_precedent['DATA'][conservees].unique()), pd.Series(ajoutees)], ignore_index=True)
+
+    # Une DATA est un KPI si elle l'est dans au moins un rapport. Une DATA KPI dans l'export précédent le reste,
+    # sauf si ses KPI venaient de rapports supprimés ou modifiés : les rapports inchangés sont alors vérifiés.
+    types_precedents = df_precedent.drop_duplicates('DATA').set_index('DATA')['Type'].reindex(data)
+    etait_kpi = (types_precedents == 'KPI').to_numpy()
+    kpi_recalcules = rows_in(data, df_tokens.loc[df_tokens['Type'] == 'KPI', 'DATA'])
+    douteuses = etait_kpi & ~kpi_recalcules & rows_in(data, kpi_retires)
+    est_kpi = kpi_recalcules | (etait_kpi & ~douteuses)
+    if douteuses.any():
+        est_kpi |= douteuses & rows_in(data, kpi_inchanges())
+
+    types = pd.Categorical.from_codes(np.where(est_kpi, 0, 1), categories=TYPES_DATA)
+    retypees = pd.Series(types, index=data)[types_precedents.notna().to_numpy() & (est_kpi != etait_kpi)]
+
+    df_data = join_powerapp(df_powerapp, data)
+    df_data['Type'] = types[pd.Index(data).get_indexer(df_data['DATA'])]
+    df_data = stabilize_ids(df_data, 'DATA', 'ID_DATA', df_precedent, IDS_STABLES['Table_DATA'][2])
+    df_data.insert(0, 'ID_DATA', df_data.pop('ID_DATA'))
+    return compact_frame(df_data, ['Qualité', 'Famille donnée']), retypees
+
+def _repeter_doublons(lignes, data, df_data):
+    # process_rapport_data_2 produit une ligne par jeton et par ligne de df_data de même DATA
+    comptes = df_data['DATA'].value_counts()
+    if len(comptes) == 0 or comptes.max() <= 1:
+        return lignes
+    return np.repeat(lignes, comptes.reindex(np.asarray(data, dtype=object)).fillna(1).to_numpy(dtype=np.int64))
+
+def _numeros_colonnes(colonnes):
+    # 'Colonne3' -> 3, calculé une fois par libellé distinct
+    codes, libelles = pd.factorize(colonnes)
+    return np.array([id_number(libelle) for libelle in libelles], dtype=np.int64)[codes]
+
+# Étapes de main_etl_incremental signalées à `progress` : écart, découpages, tables de référence,
+# traitements des rapports recalculés et fusion des trois tables de rapports
+NB_ETAPES_INCREMENTALES = 14
+
+def main_etl_incremental(df_powerapp, df_source, precedent, profiler=None, progress=None):
+    # `precedent` : feuilles du fichier transformé précédent (dict, ExcelWorkbook ou ColumnarArchive).
+    # Seuls les rapports ajoutés, modifiés ou supprimés sont découpés ; les tables de référence sont mises à jour
+    # à partir de leurs jetons et les lignes des rapports inchangés sont reprises du fichier précédent.
+    logging.info("Début du traitement incrémental")
+    precedent = {table: fill_empty_cells(precedent[table], COLONNES_VIDES_EXPORT.get(table, [])) for table in TABLES_ETL}
+    enregistrer = profiler.record if profiler is not None else lambda nom, fonction, *args: fonction(*args)
+    terminees = []
+
+    def executer(nom, fonction, *args):
+        resultat = enregistrer(nom, fonction, *args)
+        terminees.append(nom)
+        if progress is not None:
+            progress(nom, len(terminees), NB_ETAPES_INCREMENTALES)
+        return resultat
+
+    df_rapport_precedent = precedent['Table_Rapport']
+    rapports_a_traiter, rapports_inchanges = executer('diff_reports', diff_reports, df_source, df_rapport_precedent)
+    logging.info(f"{len(rapports_a_traiter)} rapports ajoutés ou modifiés, {len(rapports_inchanges)} inchangés")
+
+    est_delta = rows_in(df_source['Nom du rapport'], rapports_a_traiter)
+    lignes_delta = np.flatnonzero(est_delta)
+    df_delta = df_source.iloc[lignes_delta].reset_index(drop=True)
+    repris = {}
+    for table in ('Table_Rapport', 'Table_Rapport_Data', 'Table_Rapport_Prompt'):
+        masque = rows_in(precedent[table]['Nom du rapport'], rapports_inchanges)
+        repris[table] = precedent[table] if masque.all() else precedent[table][masque]
+    df_tokens = executer('tokenize_kpi_maille', tokenize_kpi_maille, df_delta)
+    df_prompts = executer('tokenize_prompts', tokenize_prompts, df_delta)
+
+    # Tables de référence : clés des lignes reprises et des rapports recalculés
+    retires = ~rows_in(df_rapport_precedent['Nom du rapport'], rapports_inchanges)
+    kpi_retires = np.asarray(_decouper(df_rapport_precedent.loc[retires, 'KPI'].reset_index(drop=True))[1], dtype=object)
+    kpi_inchanges = lambda: np.asarray(_decouper(df_source['KPI'][~est_delta].reset_index(drop=True))[1], dtype=object)
+    df_data, data_retypees = executer('update_table_data', update_table_data, df_powerapp, precedent['Table_DATA'],
+                       repris['Table_Rapport_Data']['DATA'], df_tokens, kpi_retires, kpi_inchanges)
+    references = {
+        'Table_Prompt': (repris['Table_Rapport_Prompt']['Prompt'], df_prompts['Prompt']),
+        'Table_PO_DATA': (repris['Table_Rapport']['PO Data'], df_delta['PO Data']),
+        'Table_AxeTemps': (repris['Table_Rapport']['Axe temps du rapport'], df_delta['Axe temps du rapport']),
+    }
+    tables = {'Table_DATA': df_data}
+    for table, (cles_reprises, cles_nouvelles) in references.items():
+        tables[table] = executer(f'update_{table}', update_reference_table, table, precedent[table],
+                                 cles_reprises, cles_nouvelles)
+
+    # Rapports ajoutés ou modifiés : seuls ces rapports passent par les traitements ligne à ligne
+    merged_df_Prompt = executer('process_rapport_prompt', process_rapport_prompt, tables['Table_Prompt'], df_delta, df_prompts)
+    df_Rapport = executer('process_rapport_data', process_rapport_data, df_delta)
+    df_Rapport['ID_RAPPORT'] = stabilize_ids(
+        df_Rapport[['Nom du rapport']].drop_duplicates(), 'Nom du rapport', 'ID_RAPPORT',
+        df_rapport_precedent[['Nom du rapport', 'ID_RAPPORT']].drop_duplicates(),
+        initiales_rapport,
+    ).set_index('Nom du rapport')['ID_RAPPORT'].reindex(df_Rapport['Nom du rapport']).to_numpy()
+    df_Rapport_data = executer('process_rapport_data_2', process_rapport_data_2, df_Rapport,
+                               df_data[rows_in(df_data['DATA'], df_tokens['DATA'])], df_tokens)
+    merged_Rapport2 = executer('process_rapport_part2', process_rapport_part2, df_Rapport, tables['Table_AxeTemps'], tables['Table_PO_DATA'])
+
+    # Rapports inchangés : lignes reprises telles quelles, remises à leur ligne du source
+    donnees_precedentes = precedent['Table_DATA']
+
+    def jetons(lignes):
+        df_jetons = tokenize_kpi_maille(df_source.iloc[lignes].reset_index(drop=True))
+        return _repeter_doublons(lignes[df_jetons['ligne'].to_numpy()], df_jetons['DATA'], donnees_precedentes), None
+
+    def prompts(lignes):
+        df_lignes = tokenize_prompts(df_source.iloc[lignes].reset_index(drop=True))
+        return lignes[df_lignes['ligne'].to_numpy()], df_lignes['Colonne'].cat.codes.to_numpy() + 1
+
+    colonnes_prompt = _numeros_colonnes(repris['Table_Rapport_Prompt']['Colonne'])
+    rapports = df_source['Nom du rapport']
+    lignes_rapport = source_lines(rapports, repris['Table_Rapport']['Nom du rapport'], lambda lignes: (lignes, None))
+    lignes_data = source_lines(rapports, repris['Table_Rapport_Data']['Nom du rapport'], jetons)
+    lignes_prompt = source_lines(rapports, repris['Table_Rapport_Prompt']['Nom du rapport'], prompts, colonnes_prompt)
+    df_Rapport_data = executer('merge_Table_Rapport_Data', merge_report_rows, repris['Table_Rapport_Data'], df_Rapport_data,
+                               np.concatenate([lignes_data, _repeter_doublons(lignes_delta[df_tokens['ligne'].to_numpy()], df_tokens['DATA'], df_data)]))
+    merged_df_Prompt = executer('merge_Table_Rapport_Prompt', merge_report_rows, repris['Table_Rapport_Prompt'], merged_df_Prompt,
+                                np.concatenate([lignes_prompt, lignes_delta[df_prompts['ligne'].to_numpy()]]),
+                                np.concatenate([colonnes_prompt, df_prompts['Colonne'].cat.codes.to_numpy() + 1]))
+    merged_Rapport2 = executer('merge_Table_Rapport', merge_report_rows, repris['Table_Rapport'], merged_Rapport2,
+                               np.concatenate([lignes_rapport, lignes_delta]))
+
+    # Type des DATA dont le type a changé, dans les lignes reprises
+    if len(data_retypees):
+        a_retyper = rows_in(df_Rapport_data['DATA'], data_retypees.index)
+        df_Rapport_data['Type'] = df_Rapport_data['Type'].astype(object).where(
+            ~a_retyper, df_Rapport_data['DATA'].astype(object).map(data_retypees.astype(object)))
 
     all_dataframes = {
         'Table_DATA': df_data,
-        'Table_Prompt': df5,
-        'Table_PO_DATA': df_po_data,
+        'Table_Prompt': tables['Table_Prompt'],
+        'Table_PO_DATA': tables['Table_PO_DATA'],
         'Table_Rapport_Prompt': merged_df_Prompt,
         'Table_Rapport_Data': df_Rapport_data,
-        'Table_AxeTemps': df_Axe_Temps,
-        'Table_Rapport': merged_Rapport2
+        'Table_AxeTemps': tables['Table_AxeTemps'],
+        'Table_Rapport': merged_Rapport2,
     }
 
+    logging.info("Fin du traitement incrémental")
     return all_dataframes
 
-def process_similar_data(df_data):
-    logging.info("Début du traitement des données similaires")
-    
-    # Création de la colonne contenant les Données Similaires
-    df_data['données similaires'] = df_data.apply(
-        lambda row: ', '.join(
-            df_data.loc[df_data['Descriptif de la donnée'] == row['Descriptif de la donnée'], 'DATA'].unique()
-        ), axis=1
-    )
-    df_data['données similaires'] = df_data.apply(
-        lambda row: ', '.join(
-            [DATA for DATA in row['données similaires'].split(', ') if DATA != row['DATA']]
-        ), axis=1
-    )
-    
-    logging.info("Fin du traitement des données similaires")
-    return df_data
+def run_etl_job(job, cache, cle_etl, contenu_powerapp, contenu_source, contenu_precedent, format='xlsx'):
+    # Exécutée dans le pool de tâches : aucun appel à Streamlit ici
+    with Profiler() as profiler:
+        job.report(0.0, "Lecture des fichiers")
+        with profiler.stage('lecture_powerapp') as mesure:
+            df_powerapp = read_excel_cached(cache, contenu_powerapp, cle_etl[1], read_powerapp)
+            mesure['lignes_sortie'] = len(df_powerapp)
+        with profiler.stage('lecture_source') as mesure:
+            df_source = read_excel_cached(cache, contenu_source, cle_etl[2], read_source)
+            mesure['lignes_sortie'] = len(df_source)
+
+        def avancement(etape, terminees, total):
+            job.report(0.1 + 0.8 * terminees / total, f"Étape {etape} terminée ({terminees}/{total})")
+
+        job.report(0.1, "Traitements ETL")
+        if contenu_precedent is not None:
+            # Mode incrémental : identifiants repris du fichier transformé précédent
+            with open_tables(contenu_precedent) as precedent:
+                all_dataframes = main_etl_incremental(df_powerapp, df_source, precedent, profiler=profiler, progress=avancement)
+        else:
+            # Appel de la fonction main_etl pour exécuter le processus ETL complet
+            all_dataframes = main_etl(df_powerapp, df_source, profiler=profiler, progress=avancement)
+
+        job.report(0.9, f"Écriture du fichier {FORMATS_EXPORT[format][0]}")
+        etape = 'export_excel' if format == 'xlsx' else f'export_{format}'
+        output = profiler.record(etape, export_tables, all_dataframes, format)
+    cache.set(cle_etl, output)
+    return {'cle': cle_etl, 'output': output, 'profiler': profiler}
+
+def run_similar_job(job, cache, cle_similaires, contenu, seuil=None, index=None):
+    # Exécutée dans le pool de tâches : aucun appel à Streamlit ici
+    job.report(0.0, "Lecture de la feuille Table_DATA")
+    # Les feuilles du fichier (Excel ou archive Parquet/Arrow) ne sont lues qu'au premier accès
+    with open_tables(contenu) as sheets:
+        if 'Table_DATA' not in sheets:
+            raise ValueError("La feuille 'Table_DATA' n'existe pas dans le fichier.")
+        df_data = sheets['Table_DATA']
+
+        job.report(0.3, "Recherche des données similaires")
+        sheets['Table_DATA'] = process_similar_data(df_data, seuil, index)
+        if index is not None and index.path:
+            index.save()
+
+        if isinstance(sheets, ColumnarArchive):
+            # Archive Parquet/Arrow : seule la table Table_DATA est réécrite
+            job.report(0.8, "Écriture de l'archive")
+            output = replace_table(contenu, 'Table_DATA', sheets['Table_DATA']).getvalue()
+        else:
+            job.report(0.8, "Écriture du fichier Excel")
+            try:
+                # Seule la feuille Table_DATA est réécrite, les autres sont recopiées telles quelles
+                output = replace_sheet(contenu, 'Table_DATA', sheets['Table_DATA']).getvalue()
+            except ValueError as e:
+                logging.info(f"Réécriture complète du classeur : {e}")
+                # Utiliser la nouvelle fonction pour créer le fichier Excel avec les tableaux formatés
+                output = create_excel_with_tables(sheets).getvalue()
+    cache.set(cle_similaires, output)
+    return {'cle': cle_similaires, 'output': output}
+
+def run_index_job(job, cache, cle_recherche, contenu):
+    # Exécutée dans le pool de tâches : aucun appel à Streamlit ici
+    job.report(0.0, "Lecture des tables")
+    with open_tables(contenu) as tables:
+        job.report(0.5, "Construction des index")
+        index = DictionaryIndex(tables)
+    cache.set(cle_recherche, index)
+    return {'cle': cle_recherche, 'index': index}
+
+def show_search(index):
+    onglet_data, onglet_rapports, onglet_po, onglet_familles = st.tabs(['DATA', 'Rapports', 'PO Data', 'Familles'])
+
+    with onglet_data:
+        motif = st.text_input("Rechercher une DATA", key='recherche_motif_data')
+        mode = st.radio("Mode", MODES_RECHERCHE, format_func=LIBELLES_RECHERCHE.get, horizontal=True, key='recherche_mode_data')
+        resultats = index.search_data(motif, mode)
+        if resultats:
+            data = st.selectbox("DATA trouvées", resultats, key='recherche_choix_data')
+            fiche = index.data_details(data)
+            if fiche is not None:
+                st.dataframe(pd.DataFrame({'Valeur': pd.Series(fiche, dtype=object)}))
+            st.write(f"Rapports utilisant **{data}**")
+            st.dataframe(pd.DataFrame({'Nom du rapport': index.reports_for_data(data)}), hide_index=True)
+        else:
+            st.info("Aucune DATA ne correspond à la recherche.")
+
+    with onglet_rapports:
+        motif = st.text_input("Rechercher un rapport", key='recherche_motif_rapport')
+        mode = st.radio("Mode", MODES_RECHERCHE, format_func=LIBELLES_RECHERCHE.get, horizontal=True, key='recherche_mode_rapport')
+        resultats = index.search_reports(motif, mode)
+        if resultats:
+            rapport = st.selectbox("Rapports trouvés", resultats, key='recherche_choix_rapport')
+            col1, col2 = st.columns(2)
+            with col1:
+                st.dataframe(pd.DataFrame({'DATA': index.data_for_report(rapport)}), hide_index=True)
+            with col2:
+                st.dataframe(pd.DataFrame({'Prompt': index.prompts_for_report(rapport)}), hide_index=True)
+        else:
+            st.info("Aucun rapport ne correspond à la recherche.")
+
+    with onglet_po:
+        po = st.selectbox("PO Data", index.po_names(), key='recherche_choix_po')
+        if po is not None:
+            st.dataframe(pd.DataFrame({'Nom du rapport': index.reports_for_po(po)}), hide_index=True)
+
+    with onglet_familles:
+        famille = st.selectbox("Famille donnée", index.families(), key='recherche_choix_famille')
+        if famille is not None:
+            st.dataframe(pd.DataFrame({'DATA': index.data_for_family(famille)}), hide_index=True)
+
+@st.fragment(run_every=1.0)
+def follow_job(cle):
+    # Rafraîchie chaque seconde sans relancer toute la page ; la page entière
+    # est relancée une fois la tâche terminée pour afficher le résultat
+    job = get_job_manager().get(st.session_state.get(f'{cle}_tache'))
+    if job is None or job.done():
+        st.rerun()
+    if job.running():
+        st.progress(job.progression, text=job.message)
+    else:
+        st.progress(0.0, text=f"En file d'attente ({get_job_manager().pending()} tâche(s) en attente sur le serveur)")
+
+def job_result(cle):
+    # Résultat de la dernière tâche de la session, conservé dans st.session_state ;
+    # None tant que la tâche tourne (la progression est alors affichée)
+    manager = get_job_manager()
+    identifiant = st.session_state.get(f'{cle}_tache')
+    job = manager.get(identifiant)
+    if job is not None and not job.done():
+        follow_job(cle)
+        return None
+    if identifiant is not None:
+        del st.session_state[f'{cle}_tache']
+    if job is not None:
+        manager.pop(identifiant)
+        try:
+            st.session_state[f'{cle}_resultat'] = job.result()
+        except Exception as e:
+            st.error(f"Une erreur s'est produite : {str(e)}")
+            return None
+    elif identifiant is not None:
+        st.error("La tâche a expiré avant d'être récupérée. Veuillez relancer le traitement.")
+    return st.session_state.get(f'{cle}_resultat')
+
+def show_problems(problemes):
+    # Fichiers rejetés avant traitement : tous les problèmes détectés sont listés ensemble
+    st.error(f"{len(problemes)} problème(s) détecté(s) dans les fichiers déposés : le traitement n'a pas été lancé.")
+    st.dataframe(pd.DataFrame(problemes, columns=Probleme._fields).astype({'ligne': 'Int64'}), hide_index=True)
+
+def submit_job(cle, nom, fonction, *args):
+    # Remplace le résultat précédent de la session par une nouvelle tâche
+    st.session_state.pop(f'{cle}_resultat', None)
+    st.session_state[f'{cle}_tache'] = get_job_manager().submit(nom, fonction, *args)
 
 def main():
+    setup_logging()
     st.title('Traitement des Données')
 
     # Liste des pages
-    pages = ['Notice d\'utilisation', 'Processus ETL', 'Données Similaires']
+    pages = ['Notice d\'utilisation', 'Processus ETL', 'Données Similaires', 'Recherche']
 
     # Initialiser l'index de la page actuelle dans la session
     if 'page_index' not in st.session_state:
@@ -390,6 +802,8 @@ def main():
         st.header('Transformation des fichiers Dictionnaire des données')
 
         uploaded_files = st.file_uploader("Choisissez les fichiers Excel", type=['xlsx'], accept_multiple_files=True, key="etl_files")
+        previous_file = st.file_uploader("Fichier transformé précédent (facultatif) : conserve les identifiants existants et ne recalcule que les rapports modifiés",
+                                         type=['xlsx', 'zip'], key="etl_previous_file")
 
         if uploaded_files and len(uploaded_files) == 2:
             files_dict = {
@@ -404,28 +818,51 @@ def main():
                     files_dict["Source Dictionnaire des données BU Colissimo"] = uploaded_file
 
             if None not in files_dict.values():
+                cache = get_result_cache()
+                contenu_powerapp = files_dict["Powerapp Dictionnaire des données BU Colissimo"].getvalue()
+                contenu_source = files_dict["Source Dictionnaire des données BU Colissimo"].getvalue()
+                contenu_precedent = previous_file.getvalue() if previous_file else None
+                empreinte_precedent = content_hash(contenu_precedent) if previous_file else None
+                format_export = st.radio("Format du fichier transformé", list(FORMATS_EXPORT), horizontal=True,
+                                         format_func=lambda format: FORMATS_EXPORT[format][0])
+                cle_etl = ('etl', content_hash(contenu_powerapp), content_hash(contenu_source), empreinte_precedent, format_export)
+
                 if st.button('Exécuter le processus ETL'):
-                    try:
-                        df_powerapp = pd.read_excel(files_dict["Powerapp Dictionnaire des données BU Colissimo"], sheet_name='Table DATA')
-                        df_source = pd.read_excel(files_dict["Source Dictionnaire des données BU Colissimo"])
-
-                        # Appel de la fonction main_etl pour exécuter le processus ETL complet
-                        all_dataframes = main_etl(df_powerapp, df_source)
-
-                        st.success("Le processus ETL a été exécuté avec succès.")
-
-                        # Utiliser la nouvelle fonction pour créer le fichier Excel avec les tableaux formatés
-                        output = create_excel_with_tables(all_dataframes)
-
-                        # Bouton de téléchargement
-                        st.download_button(
-                            label="Télécharger le fichier transformé",
-                            data=output,
-                            file_name="fichier_transforme.xlsx",
-                            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                        )
-                    except Exception as e:
-                        st.error(f"Une erreur s'est produite : {str(e)}")
+                    # Résultat déjà calculé pour ces mêmes fichiers : pas de nouvelle exécution
+                    output = cache.get(cle_etl)
+                    if output is None:
+                        # Contrôle rapide des en-têtes et d'un échantillon de lignes avant de lancer le traitement
+                        problemes = validate_inputs(contenu_powerapp, contenu_source)
+                        if problemes:
+                            show_problems(problemes)
+                        else:
+                            # Le traitement tourne dans le pool de tâches : la page reste utilisable
+                            submit_job('etl', 'etl', run_etl_job, cache, cle_etl, contenu_powerapp, contenu_source, contenu_precedent, format_export)
+                    else:
+                        st.session_state['etl_resultat'] = {'cle': cle_etl, 'output': output, 'profiler': None}
+
+                resultat = job_result('etl')
+                if resultat is not None and resultat['cle'] == cle_etl:
+                    st.success("Le processus ETL a été exécuté avec succès.")
+
+                    if resultat['profiler'] is not None:
+                        with st.expander("Mesures d'exécution par étape"):
+                            st.dataframe(resultat['profiler'].to_frame())
+                            st.download_button(
+                                label="Télécharger les mesures (JSON)",
+                                data=resultat['profiler'].to_json(),
+                                file_name="mesures_etl.json",
+                                mime="application/json"
+                            )
+
+                    # Bouton de téléchargement
+                    _, extension, mime = FORMATS_EXPORT[format_export]
+                    st.download_button(
+                        label="Télécharger le fichier transformé",
+                        data=resultat['output'],
+                        file_name=f"fichier_transforme.{extension}",
+                        mime=mime
+                    )
             else:
                 st.error("Les fichiers téléchargés ne correspondent pas aux fichiers requis. Veuillez vérifier les noms des fichiers.")
         else:
@@ -436,36 +873,77 @@ def main():
         st.header('Traitement des Données Similaires')
         st.write("""
         Une fois l’étape 1 terminée, téléchargez le fichier puis remplissez la description des nouvelles données. Une fois cela terminé, vous pouvez joindre le fichier ci-dessous pour ajouter les données similaires.        """)
-        etl_result_file = st.file_uploader("Choisissez le fichier transforme ", type=['xlsx'], key="etl_result_file")
+        etl_result_file = st.file_uploader("Choisissez le fichier transforme ", type=['xlsx', 'zip'], key="etl_result_file")
 
         if etl_result_file:
-            if st.button('Traiter les données similaires'):
-                try:
-                    # Lire toutes les feuilles du fichier Excel
-                    xls = pd.ExcelFile(etl_result_file)
-                    sheets = {sheet_name: pd.read_excel(xls, sheet_name) for sheet_name in xls.sheet_names}
-
-                    if 'Table_DATA' in sheets:
-                        sheets['Table_DATA'] = process_similar_data(sheets['Table_DATA'])
-                        st.success("Le traitement des données similaires a été effectué avec succès.")
-                    else:
-                        st.error("La feuille 'Table_DATA' n'existe pas dans le fichier.")
-                        st.stop()
-
-                    # Utiliser la nouvelle fonction pour créer le fichier Excel avec les tableaux formatés
-                    output = create_excel_with_tables_from_sheets(sheets)
+            cache = get_result_cache()
+            contenu = etl_result_file.getvalue()
+            approche = st.checkbox(
+                "Inclure les descriptifs proches (mode approché)",
+                help="Rapproche aussi les données dont le descriptif et le nom normalisés se ressemblent, "
+                     "en plus des descriptifs identiques."
+            )
+            seuil = None
+            if approche:
+                seuil = st.slider("Seuil de similarité", min_value=SEUIL_MINIMAL, max_value=1.0, value=SEUIL_PAR_DEFAUT, step=0.05)
+            cle_similaires = ('similaires', content_hash(contenu), seuil)
 
-                    st.download_button(
-                        label="Télécharger le résultat",
-                        data=output,
-                        file_name="Powerapp Dictionnaire des données BU Colissimo.xlsx",
-                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                    )
-                except Exception as e:
-                    st.error(f"Une erreur s'est produite : {str(e)}")
+            if st.button('Traiter les données similaires'):
+                output = cache.get(cle_similaires)
+                problemes = validate_transformed(contenu) if output is None else []
+                if problemes:
+                    show_problems(problemes)
+                elif output is None:
+                    # Le traitement tourne dans le pool de tâches : la page reste utilisable
+                    index = get_similarity_index() if approche else None
+                    submit_job('similaires', 'similaires', run_similar_job, cache, cle_similaires, contenu, seuil, index)
+                else:
+                    st.session_state['similaires_resultat'] = {'cle': cle_similaires, 'output': output}
+
+            resultat = job_result('similaires')
+            if resultat is not None and resultat['cle'] == cle_similaires:
+                st.success("Le traitement des données similaires a été effectué avec succès.")
+
+                # Le résultat est dans le même format que le fichier déposé
+                _, extension, mime = FORMATS_EXPORT['xlsx' if etl_result_file.name.endswith('.xlsx') else 'parquet']
+                st.download_button(
+                    label="Télécharger le résultat",
+                    data=resultat['output'],
+                    file_name=f"Powerapp Dictionnaire des données BU Colissimo.{extension}",
+                    mime=mime
+                )
         else:
             st.info("N’oubliez pas de remplir les descriptions des données avant de télécharger le fichier transforme pour le traitement des données similaires.")
 
+    elif st.session_state.page_index == 3:
+        # Page 4 : Recherche dans le dictionnaire
+        st.header('Recherche dans le dictionnaire des données')
+        st.write("""
+        Retrouvez les rapports qui utilisent une DATA, les DATA et prompts d’un rapport, les rapports d’un PO Data ou les DATA d’une famille.
+        Sans fichier joint, la recherche porte sur le dernier résultat du processus ETL.
+        """)
+        search_file = st.file_uploader("Fichier transformé (facultatif)", type=['xlsx', 'zip'], key="search_file")
+        contenu = search_file.getvalue() if search_file else (st.session_state.get('etl_resultat') or {}).get('output')
+
+        if contenu is not None:
+            cache = get_result_cache()
+            cle_recherche = ('recherche', content_hash(contenu))
+
+            resultat = st.session_state.get('recherche_resultat')
+            if st.button('Indexer le fichier', disabled=resultat is not None and resultat['cle'] == cle_recherche):
+                index = cache.get(cle_recherche)
+                if index is None:
+                    # Construction des index dans le pool de tâches ; les recherches sont ensuite instantanées
+                    submit_job('recherche', 'recherche', run_index_job, cache, cle_recherche, contenu)
+                else:
+                    st.session_state['recherche_resultat'] = {'cle': cle_recherche, 'index': index}
+
+            resultat = job_result('recherche')
+            if resultat is not None and resultat['cle'] == cle_recherche:
+                show_search(resultat['index'])
+        else:
+            st.info("Exécutez le processus ETL ou joignez un fichier transformé (xlsx ou archive Parquet/Arrow).")
+
 
 
     def on_click_prev():
@@ -0,0 +1,168 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from app import FORMATS_EXPORT, main_etl, main_etl_incremental
+from export_arrow import create_columnar_archive
+from export_excel import create_excel_with_tables
+from ingestion import open_tables, read_powerapp, read_source
+from instrumentation import Profiler
+from validation import SchemaError, validate_inputs
+
+MARQUEUR_POWERAPP = 'Powerapp'
+MARQUEUR_SOURCE = 'Source'
+
+
+def find_pairs(dossier):
+    # Appariement par nom : 'Powerapp <X>.xlsx' va avec 'Source <X>.xlsx'
+    powerapps, sources = {}, {}
+    for nom in sorted(os.listdir(dossier)):
+        if not nom.endswith('.xlsx') or nom.startswith('~$'):
+            continue
+        chemin = os.path.join(dossier, nom)
+        base = os.path.splitext(nom)[0]
+        if MARQUEUR_POWERAPP in base:
+            powerapps[base.replace(MARQUEUR_POWERAPP, '', 1).strip()] = chemin
+        elif MARQUEUR_SOURCE in base:
+            sources[base.replace(MARQUEUR_SOURCE, '', 1).strip()] = chemin
+
+    for cle in sorted(set(powerapps) ^ set(sources)):
+        logging.warning(f"Fichier sans correspondance ignoré : {powerapps.get(cle) or sources.get(cle)}")
+
+    return [
+        {'nom': cle or 'catalogue', 'powerapp': powerapps[cle], 'source': sources[cle]}
+        for cle in sorted(set(powerapps) & set(sources))
+    ]
+
+
+def read_manifest(chemin):
+    # Manifeste JSON : [{"nom": ..., "powerapp": ..., "source": ...}, ...], chemins relatifs au manifeste
+    with open(chemin, encoding='utf-8') as fichier:
+        entrees = json.load(fichier)
+    dossier = os.path.dirname(os.path.abspath(chemin))
+    return [
+        {
+            'nom': entree['nom'],
+            'powerapp': os.path.join(dossier, entree['powerapp']),
+            'source': os.path.join(dossier, entree['source']),
+        }
+        for entree in entrees
+    ]
+
+
+def process_pair(paire, dossier_sortie, incremental=False, format='xlsx'):
+    resultat = {'nom': paire['nom'], 'statut': 'ok', 'durees': {}}
+    debut = time.perf_counter()
+    sortie = os.path.join(dossier_sortie, f"fichier_transforme {paire['nom']}.{FORMATS_EXPORT[format][1]}")
+    profiler = Profiler()
+    try:
+        # Fichiers mal formés rejetés avant la lecture complète, avec la liste de tous les problèmes
+        problemes = profiler.record('validation', validate_inputs, paire['powerapp'], paire['source'])
+        if problemes:
+            resultat['problemes'] = [probleme._asdict() for probleme in problemes]
+            raise SchemaError(problemes)
+
+        etape = time.perf_counter()
+        df_powerapp = profiler.record('lecture_powerapp', read_powerapp, paire['powerapp'])
+        df_source = profiler.record('lecture_source', read_source, paire['source'])
+        resultat['durees']['lecture'] = time.perf_counter() - etape
+
+        etape = time.perf_counter()
+        if incremental and os.path.exists(sortie):
+            # Le fichier transformé de l'exécution précédente sert de référence pour les identifiants
+            with open(sortie, 'rb') as fichier, open_tables(fichier.read()) as precedent:
+                all_dataframes = main_etl_incremental(df_powerapp, df_source, precedent, profiler=profiler)
+            resultat['mode'] = 'incremental'
+        else:
+            all_dataframes = main_etl(df_powerapp, df_source, profiler=profiler)
+            resultat['mode'] = 'complet'
+        resultat['durees']['etl'] = time.perf_counter() - etape
+
+        etape = time.perf_counter()
+        if format == 'xlsx':
+            profiler.record('export_excel', create_excel_with_tables, all_dataframes, output=sortie)
+        else:
+            profiler.record(f'export_{format}', create_columnar_archive, all_dataframes, sortie, format)
+        resultat['durees']['export'] = time.perf_counter() - etape
+        resultat['sortie'] = sortie
+    except Exception as e:
+        resultat['statut'] = 'erreur'
+        resultat['erreur'] = f"{type(e).__name__}: {e}"
+        resultat['trace'] = traceback.format_exc()
+    finally:
+        profiler.close()
+    resultat['durees']['total'] = time.perf_counter() - debut
+    # Détail par étape (durée, CPU, lignes, pic de RSS) repris dans le rapport JSON
+    resultat['etapes'] = profiler.records
+    return resultat
+
+
+def run_batch(paires, dossier_sortie, max_workers=None, incremental=False, format='xlsx'):
+    os.makedirs(dossier_sortie, exist_ok=True)
+    resultats = []
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(process_pair, paire, dossier_sortie, incremental, format) for paire in paires]
+        for future in as_completed(futures):
+            resultat = future.result()
+            if resultat['statut'] == 'ok':
+                logging.info(f"{resultat['nom']} traité en {resultat['durees']['total']:.1f} s")
+            else:
+                logging.error(f"{resultat['nom']} en échec : {resultat['erreur']}")
+            resultats.append(resultat)
+    return sorted(resultats, key=lambda resultat: resultat['nom'])
+
+
+def print_report(resultats, flux=sys.stdout):
+    print(f"{'catalogue':<40} {'statut':<7} {'lecture':>8} {'etl':>8} {'export':>8} {'total':>8}", file=flux)
+    for resultat in resultats:
+        durees = resultat['durees']
+        colonnes = ' '.join(
+            f"{durees[etape]:>8.2f}" if etape in durees else f"{'-':>8}"
+            for etape in ('lecture', 'etl', 'export', 'total')
+        )
+        print(f"{resultat['nom']:<40} {resultat['statut']:<7} {colonnes}", file=flux)
+    for resultat in resultats:
+        if resultat['statut'] != 'ok':
+            print(f"\n{resultat['nom']} : {resultat['erreur']}", file=flux)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Exécute l'ETL du dictionnaire de données sur plusieurs couples de fichiers Powerapp/Source."
+    )
+    entree = parser.add_mutually_exclusive_group(required=True)
+    entree.add_argument('--dossier', help="Dossier contenant les fichiers 'Powerapp <BU>.xlsx' et 'Source <BU>.xlsx'")
+    entree.add_argument('--manifeste', help="Fichier JSON listant les couples {nom, powerapp, source}")
+    parser.add_argument('--sortie', required=True, help="Dossier où écrire les fichiers transformés")
+    parser.add_argument('--processus', type=int, default=None, help="Nombre de processus (défaut : nombre de cœurs)")
+    parser.add_argument('--rapport', help="Chemin du rapport JSON des durées et des erreurs")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Reprend les identifiants des fichiers transformés déjà présents dans --sortie")
+    parser.add_argument('--format', choices=list(FORMATS_EXPORT), default='xlsx',
+                        help="Format des fichiers transformés : classeur Excel ou archive zip de tables Parquet/Arrow IPC")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    paires = find_pairs(args.dossier) if args.dossier else read_manifest(args.manifeste)
+    if not paires:
+        logging.error("Aucun couple de fichiers Powerapp/Source trouvé.")
+        return 1
+
+    resultats = run_batch(paires, args.sortie, args.processus, args.incremental, args.format)
+    print_report(resultats)
+
+    if args.rapport:
+        with open(args.rapport, 'w', encoding='utf-8') as fichier:
+            json.dump(resultats, fichier, ensure_ascii=False, indent=2)
+
+    return 0 if all(resultat['statut'] == 'ok' for resultat in resultats) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
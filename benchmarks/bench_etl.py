@@ -0,0 +1,159 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime
+
+import openpyxl
+import pandas as pd
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RACINE)
+
+from app import ETAPES_ETL, main_etl, main_etl_incremental
+from export_excel import create_excel_with_tables, replace_sheet
+from generateur import generate_catalogue
+from ingestion import read_powerapp, read_source
+from instrumentation import count_rows
+from mesures import mesurer
+from similarite import process_similar_data
+
+TAILLES_PAR_DEFAUT = [1_000, 10_000, 100_000]
+SEUIL_REGRESSION = 1.25
+DUREE_MINIMALE = 0.05
+
+
+def _enregistrer(resultats, nom, resultat, mesure, lignes_entree):
+    mesure['lignes_entree'] = lignes_entree
+    mesure['lignes_sortie'] = count_rows(resultat)
+    resultats[nom] = mesure
+    print(f"  {nom:<28} {mesure['duree_s']:>9.3f} s {mesure['pic_rss_mo']:>9.1f} Mo")
+    return resultat
+
+
+def bench_size(nb_rapports, parametres, avec_export=True):
+    df_powerapp, df_source = generate_catalogue(nb_rapports, **parametres)
+    resultats = {}
+
+    # Ingestion depuis des classeurs xlsx en mémoire
+    contenu_powerapp = create_excel_with_tables({'Table DATA': df_powerapp}).getvalue()
+    contenu_source = create_excel_with_tables({'Source': df_source}).getvalue()
+    _enregistrer(resultats, 'read_powerapp', *mesurer(read_powerapp, contenu_powerapp), len(df_powerapp))
+    _enregistrer(resultats, 'read_source', *mesurer(read_source, contenu_source), len(df_source))
+
+    # Chaque étape de l'ETL, isolée, dans l'ordre de déclaration du graphe
+    valeurs = {'df_powerapp': df_powerapp, 'df_source': df_source}
+    for stage in ETAPES_ETL:
+        entrees = [valeurs[nom] for nom in stage.inputs]
+        valeurs[stage.name] = _enregistrer(resultats, stage.function.__name__,
+                                           *mesurer(stage.function, *entrees), count_rows(entrees[-1]))
+
+    all_dataframes = _enregistrer(resultats, 'main_etl', *mesurer(main_etl, df_powerapp, df_source),
+                                  len(df_source))
+    # Mode incrémental sur le résultat précédent : source inchangée, puis KPI d'un rapport sur cent modifiés
+    _enregistrer(resultats, 'main_etl_incremental',
+                 *mesurer(main_etl_incremental, df_powerapp, df_source, all_dataframes), len(df_source))
+    df_source_modifiee = df_source.copy()
+    df_source_modifiee.loc[::100, 'KPI'] = 'data neuve, ' + df_source_modifiee.loc[::100, 'KPI'].fillna('')
+    _enregistrer(resultats, 'main_etl_incremental_modifie',
+                 *mesurer(main_etl_incremental, df_powerapp, df_source_modifiee, all_dataframes), len(df_source))
+    df_similaires = _enregistrer(resultats, 'process_similar_data',
+                                 *mesurer(process_similar_data, all_dataframes['Table_DATA'].copy()),
+                                 len(all_dataframes['Table_DATA']))
+
+    if avec_export:
+        sortie = _enregistrer(resultats, 'create_excel_with_tables',
+                              *mesurer(create_excel_with_tables, all_dataframes), count_rows(all_dataframes))
+        _enregistrer(resultats, 'replace_sheet',
+                     *mesurer(replace_sheet, sortie.getvalue(), 'Table_DATA', df_similaires), len(df_similaires))
+
+    return resultats
+
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=RACINE,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(reference, courant, seuil=SEUIL_REGRESSION, duree_minimale=DUREE_MINIMALE):
+    # Mesures dont la durée dépasse `seuil` fois la référence (les mesures trop courtes sont ignorées)
+    regressions = []
+    for taille, mesures in courant['resultats'].items():
+        for nom, mesure in mesures.items():
+            ancienne = reference['resultats'].get(taille, {}).get(nom)
+            if ancienne is None or max(ancienne['duree_s'], mesure['duree_s']) < duree_minimale:
+                continue
+            rapport = mesure['duree_s'] / max(ancienne['duree_s'], 1e-9)
+            if rapport > seuil:
+                regressions.append({'taille': taille, 'mesure': nom, 'reference_s': ancienne['duree_s'],
+                                    'courant_s': mesure['duree_s'], 'rapport': rapport})
+    return regressions
+
+
+def print_regressions(regressions):
+    if not regressions:
+        print("Aucune régression détectée.")
+    for regression in regressions:
+        print(f"RÉGRESSION {regression['taille']:>8} {regression['mesure']:<28} "
+              f"{regression['reference_s']:.3f} s -> {regression['courant_s']:.3f} s (x{regression['rapport']:.2f})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mesure chaque étape de l'ETL sur des catalogues synthétiques.")
+    parser.add_argument('--tailles', type=int, nargs='+', default=TAILLES_PAR_DEFAUT, help="Nombres de lignes Source")
+    parser.add_argument('--data-par-rapport', type=int, default=6)
+    parser.add_argument('--prompts-par-rapport', type=int, default=3)
+    parser.add_argument('--doublons-descriptif', type=float, default=0.2)
+    parser.add_argument('--sans-export', action='store_true', help="Ne mesure pas l'export xlsx")
+    parser.add_argument('--sortie', help="Fichier JSON où enregistrer les résultats")
+    parser.add_argument('--reference', help="Résultats JSON d'une version précédente à comparer")
+    parser.add_argument('--seuil', type=float, default=SEUIL_REGRESSION)
+    parser.add_argument('--comparer', nargs=2, metavar=('REFERENCE', 'COURANT'),
+                        help="Compare deux fichiers de résultats sans lancer de mesure")
+    args = parser.parse_args(argv)
+
+    if args.comparer:
+        with open(args.comparer[0], encoding='utf-8') as f_ref, open(args.comparer[1], encoding='utf-8') as f_cour:
+            regressions = compare(json.load(f_ref), json.load(f_cour), args.seuil)
+        print_regressions(regressions)
+        return 1 if regressions else 0
+
+    parametres = {
+        'data_par_rapport': args.data_par_rapport,
+        'prompts_par_rapport': args.prompts_par_rapport,
+        'taux_doublons_descriptif': args.doublons_descriptif,
+    }
+    courant = {
+        'meta': {
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'commit': _commit(),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'openpyxl': openpyxl.__version__,
+            'parametres': parametres,
+        },
+        'resultats': {},
+    }
+    for taille in args.tailles:
+        print(f"{taille} lignes Source")
+        courant['resultats'][str(taille)] = bench_size(taille, parametres, avec_export=not args.sans_export)
+
+    if args.sortie:
+        with open(args.sortie, 'w', encoding='utf-8') as fichier:
+            json.dump(courant, fichier, ensure_ascii=False, indent=2)
+
+    if args.reference:
+        with open(args.reference, encoding='utf-8') as fichier:
+            regressions = compare(json.load(fichier), courant, args.seuil)
+        print_regressions(regressions)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,103 @@
+import json
+import os
+import subprocess
+import sys
+import time
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+from openpyxl.utils import get_column_letter
+from openpyxl.worksheet.table import Table, TableStyleInfo
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from export_arrow import create_columnar_archive
+from export_excel import create_excel_with_tables
+from ingestion import open_tables
+from mesures import mesurer
+
+TAILLES = [1_000, 10_000, 50_000, 100_000]
+
+
+def ancien_create_excel_with_tables(all_dataframes):
+    # Implémentation d'origine (pd.ExcelWriter + openpyxl en mémoire), conservée comme référence
+    output = BytesIO()
+    with pd.ExcelWriter(output, engine='openpyxl') as writer:
+        for sheet_name, df in all_dataframes.items():
+            df.to_excel(writer, sheet_name=sheet_name, index=False)
+        workbook = writer.book
+        for sheet_name, df in all_dataframes.items():
+            worksheet = workbook[sheet_name]
+            ref = f"A1:{get_column_letter(df.shape[1])}{df.shape[0] + 1}"
+            table = Table(displayName=f"Table_{sheet_name}", ref=ref)
+            table.tableStyleInfo = TableStyleInfo(name="TableStyleMedium9", showFirstColumn=False,
+                                                  showLastColumn=False, showRowStripes=True, showColumnStripes=False)
+            worksheet.add_table(table)
+    output.seek(0)
+    return output
+
+
+EXPORTEURS = {
+    'streaming': create_excel_with_tables,
+    'ancien': ancien_create_excel_with_tables,
+    'parquet': lambda tables: create_columnar_archive(tables, format='parquet'),
+    'arrow': lambda tables: create_columnar_archive(tables, format='arrow'),
+}
+
+
+def generer_tables(nb_lignes, seed=0):
+    rng = np.random.default_rng(seed)
+    ids = pd.Series([f"DATA{i + 1:04d}" for i in range(nb_lignes)])
+    texte = pd.Series([f"data {i}" for i in rng.integers(0, nb_lignes, nb_lignes)])
+    descriptif = texte.where(rng.random(nb_lignes) > 0.2)
+    return {
+        'Table_DATA': pd.DataFrame({'ID_DATA': ids, 'DATA': texte, 'Descriptif de la donnée': descriptif,
+                                    'Type': rng.choice(['KPI', "Maille d'analyse"], nb_lignes)}),
+        'Table_Rapport_Data': pd.DataFrame({'ID_RAPPORT': rng.integers(0, 1000, nb_lignes), 'ID_DATA': ids,
+                                            'Poids': rng.random(nb_lignes)}),
+    }
+
+
+def mesurer_export(exporteur, nb_lignes):
+    # Exécuté dans un sous-processus : le pic de RSS ne concerne que cet export
+    tables = generer_tables(nb_lignes)
+    output, mesure = mesurer(EXPORTEURS[exporteur], tables)
+    # Relecture complète du fichier produit, comme le ferait l'étape suivante
+    debut = time.perf_counter()
+    with open_tables(output.getvalue()) as relu:
+        for nom in relu:
+            relu[nom]
+    print(json.dumps({'duree': mesure['duree_s'], 'pic_rss_mo': mesure['pic_rss_mo'],
+                      'relecture': time.perf_counter() - debut, 'taille_mo': len(output.getvalue()) / 2 ** 20}))
+
+
+def verifier_equivalence(nb_lignes=500):
+    tables = generer_tables(nb_lignes)
+    relus = [pd.read_excel(EXPORTEURS[exporteur](tables), sheet_name=None) for exporteur in ('streaming', 'ancien')]
+    for nom in tables:
+        pd.testing.assert_frame_equal(relus[0][nom], relus[1][nom])
+    # Les archives Parquet/Arrow restituent les tables à l'identique, types compris
+    for exporteur in ('parquet', 'arrow'):
+        with open_tables(EXPORTEURS[exporteur](tables).getvalue()) as relu:
+            for nom, df in tables.items():
+                pd.testing.assert_frame_equal(relu[nom], df)
+
+
+def main():
+    verifier_equivalence()
+    print(f"{'lignes':>8} {'exporteur':>10} {'durée (s)':>10} {'pic RSS (Mo)':>13} {'relecture (s)':>14} {'taille (Mo)':>12}")
+    for taille in TAILLES:
+        for exporteur in EXPORTEURS:
+            sortie = subprocess.run([sys.executable, __file__, exporteur, str(taille)],
+                                    capture_output=True, text=True, check=True).stdout
+            resultat = json.loads(sortie)
+            print(f"{taille:>8} {exporteur:>10} {resultat['duree']:>10.2f} {resultat['pic_rss_mo']:>13.1f} "
+                  f"{resultat['relecture']:>14.2f} {resultat['taille_mo']:>12.2f}")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 3:
+        mesurer_export(sys.argv[1], int(sys.argv[2]))
+    else:
+        main()
@@ -0,0 +1,62 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import main_etl
+from generateur import generate_catalogue
+from mesures import mesurer
+
+TAILLES_PAR_DEFAUT = [10_000, 100_000]
+
+
+def mesurer_main_etl(nb_rapports):
+    # Exécuté dans un sous-processus : le pic de RSS ne concerne que main_etl
+    df_powerapp, df_source = generate_catalogue(nb_rapports)
+    tables, mesure = mesurer(main_etl, df_powerapp, df_source)
+    memoire = {nom: df.memory_usage(deep=True).sum() / 2 ** 20 for nom, df in tables.items()}
+    print(json.dumps({'duree_s': mesure['duree_s'], 'pic_rss_mo': mesure['pic_rss_mo'],
+                      'tables_mo': sum(memoire.values()), 'par_table_mo': memoire}))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Mesure le pic de mémoire de main_etl et la taille en mémoire des tables produites."
+    )
+    parser.add_argument('--tailles', type=int, nargs='+', default=TAILLES_PAR_DEFAUT, help="Nombres de lignes Source")
+    parser.add_argument('--sortie', help="Fichier JSON où enregistrer les résultats")
+    parser.add_argument('--reference', help="Résultats JSON d'une version précédente à comparer")
+    args = parser.parse_args(argv)
+
+    reference = {}
+    if args.reference:
+        with open(args.reference, encoding='utf-8') as fichier:
+            reference = json.load(fichier)
+
+    print(f"{'lignes':>8} {'durée (s)':>10} {'pic RSS (Mo)':>13} {'tables (Mo)':>12}   référence (pic / tables)")
+    resultats = {}
+    for taille in args.tailles:
+        sortie = subprocess.run([sys.executable, __file__, '--mesurer', str(taille)],
+                                capture_output=True, text=True, check=True).stdout
+        resultat = resultats[str(taille)] = json.loads(sortie.splitlines()[-1])
+        ligne = f"{taille:>8} {resultat['duree_s']:>10.2f} {resultat['pic_rss_mo']:>13.1f} {resultat['tables_mo']:>12.1f}"
+        ancien = reference.get(str(taille))
+        if ancien:
+            ligne += (f"   {ancien['pic_rss_mo']:.1f} / {ancien['tables_mo']:.1f} Mo "
+                      f"(x{resultat['pic_rss_mo'] / ancien['pic_rss_mo']:.2f} / x{resultat['tables_mo'] / ancien['tables_mo']:.2f})")
+        print(ligne)
+
+    if args.sortie:
+        with open(args.sortie, 'w', encoding='utf-8') as fichier:
+            json.dump(resultats, fichier, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 3 and sys.argv[1] == '--mesurer':
+        mesurer_main_etl(int(sys.argv[2]))
+    else:
+        sys.exit(main())
@@ -0,0 +1,57 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import main_etl
+from generateur import generate_catalogue
+from recherche import DictionaryIndex
+
+TAILLES_PAR_DEFAUT = [10_000, 100_000]
+REPETITIONS = 200
+
+
+def chronometrer_ms(fonction, *args):
+    debut = time.perf_counter()
+    for _ in range(REPETITIONS):
+        fonction(*args)
+    return (time.perf_counter() - debut) / REPETITIONS * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Mesure la construction de l'index de recherche et la durée des consultations."
+    )
+    parser.add_argument('--tailles', type=int, nargs='+', default=TAILLES_PAR_DEFAUT, help="Nombres de lignes Source")
+    args = parser.parse_args(argv)
+
+    for taille in args.tailles:
+        tables = main_etl(*generate_catalogue(taille))
+        debut = time.perf_counter()
+        index = DictionaryIndex(tables)
+        construction = time.perf_counter() - debut
+        liens = len(tables['Table_Rapport_Data']) + len(tables['Table_Rapport_Prompt'])
+        print(f"\n{taille} lignes Source, {liens} liens : index construit en {construction:.2f} s")
+
+        data = tables['Table_Rapport_Data']['DATA'].iloc[0]
+        rapport = tables['Table_Rapport']['Nom du rapport'].iloc[0]
+        consultations = {
+            'rapports_par_data': (index.reports_for_data, data),
+            'data_par_rapport': (index.data_for_report, rapport),
+            'prompts_par_rapport': (index.prompts_for_report, rapport),
+            'rapports_par_po': (index.reports_for_po, tables['Table_Rapport']['PO Data'].iloc[0]),
+            'recherche_data (prefixe)': (index.search_data, 'data vol'),
+            'recherche_data (contient)': (index.search_data, 'colis', 'contient'),
+            'recherche_rapport (prefixe)': (index.search_reports, 'rapport livr'),
+            'recherche_rapport (contient)': (index.search_reports, 'agence retour', 'contient'),
+        }
+        print(f"{'consultation':<30} {'durée (ms)':>11}")
+        for nom, (fonction, *arguments) in consultations.items():
+            print(f"{nom:<30} {chronometrer_ms(fonction, *arguments):>11.3f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,107 @@
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from similarite import MinHashIndex, SEUIL_MINIMAL, SEUIL_PAR_DEFAUT, process_similar_data
+
+TAILLES = [1_000, 5_000, 10_000, 50_000, 100_000]
+TAILLE_MAX_ANCIEN = 5_000
+TAILLES_APPROCHE = [1_000, 10_000, 50_000]
+MOTS = ['volume', 'colis', 'livraison', 'délai', 'client', 'retour', 'agence', 'tournée', 'incident', 'tarif',
+        'poids', 'distribution', 'réclamation', 'dépôt', 'plateforme', 'qualité', 'flux', 'international']
+
+
+def ancien_process_similar_data(df_data):
+    # Implémentation d'origine (O(n²)), conservée comme référence
+    df_data['données similaires'] = df_data.apply(
+        lambda row: ', '.join(
+            df_data.loc[df_data['Descriptif de la donnée'] == row['Descriptif de la donnée'], 'DATA'].unique()
+        ), axis=1
+    )
+    df_data['données similaires'] = df_data.apply(
+        lambda row: ', '.join(
+            [DATA for DATA in row['données similaires'].split(', ') if DATA != row['DATA']]
+        ), axis=1
+    )
+    return df_data
+
+
+def generer_table_data(nb_lignes, taux_doublons=0.3, seed=0):
+    rng = np.random.default_rng(seed)
+    nb_descriptifs = max(1, int(nb_lignes * (1 - taux_doublons)))
+    descriptifs = pd.Series([f"descriptif {i}" for i in rng.integers(0, nb_descriptifs, nb_lignes)], dtype=object)
+    descriptifs[rng.random(nb_lignes) < 0.1] = np.nan
+    return pd.DataFrame({
+        'ID_DATA': [f"DATA{i + 1:04d}" for i in range(nb_lignes)],
+        'DATA': [f"data {i}" for i in rng.integers(0, nb_lignes, nb_lignes)],
+        'Descriptif de la donnée': descriptifs,
+    })
+
+
+def generer_descriptifs_proches(nb_lignes, taux_proches=0.2, seed=0):
+    # Descriptifs aléatoires dont une partie est recopiée avec de petites variations
+    # (mot retiré, accents, ponctuation) ; renvoie aussi la ligne d'origine de chaque copie
+    rng = np.random.default_rng(seed)
+    syllabes = [consonne + voyelle for consonne in 'bcdfglmnprstv' for voyelle in 'aeiouy']
+    vocabulaire = MOTS + [''.join(rng.choice(syllabes, rng.integers(2, 5))) for _ in range(2_000)]
+    descriptifs = [' '.join(rng.choice(vocabulaire, rng.integers(5, 10))).capitalize() for _ in range(nb_lignes)]
+    origines = {}
+    for ligne in np.flatnonzero(rng.random(nb_lignes) < taux_proches):
+        origine = int(rng.integers(0, nb_lignes))
+        mots = descriptifs[origine].split()
+        if len(mots) > 5 and rng.random() < 0.5:
+            mots.pop(rng.integers(len(mots)))
+        texte = ' '.join(mots)
+        if rng.random() < 0.5:
+            texte = texte.replace('é', 'e')
+        descriptifs[ligne] = texte + ('.' if rng.random() < 0.5 else '')
+        origines[int(ligne)] = origine
+    df = pd.DataFrame({'DATA': [f"data {i}" for i in range(nb_lignes)], 'Descriptif de la donnée': descriptifs})
+    return df, origines
+
+
+def chronometrer(fonction, df, *args):
+    debut = time.perf_counter()
+    resultat = fonction(df.copy(), *args)
+    return time.perf_counter() - debut, resultat
+
+
+def main():
+    print(f"{'lignes':>8} {'nouveau (s)':>12} {'ancien (s)':>12}")
+    for taille in TAILLES:
+        df = generer_table_data(taille)
+        duree, resultat = chronometrer(process_similar_data, df)
+        duree_ancien = ''
+        if taille <= TAILLE_MAX_ANCIEN:
+            duree_ref, reference = chronometrer(ancien_process_similar_data, df)
+            pd.testing.assert_series_equal(
+                resultat['données similaires'], reference['données similaires'], check_dtype=False
+            )
+            duree_ancien = f"{duree_ref:.3f}"
+        print(f"{taille:>8} {duree:>12.3f} {duree_ancien:>12}")
+
+    # Mode approché, au seuil par défaut et au seuil minimal : premier calcul, nouveau calcul avec
+    # l'index de signatures déjà rempli, et part des copies modifiées qui retrouvent leur ligne d'origine
+    print()
+    print(f"{'lignes':>8} {'seuil':>6} {'exact (s)':>10} {'approché (s)':>13} {'avec index (s)':>15} {'rappel':>7}")
+    for taille in TAILLES_APPROCHE:
+        df, origines = generer_descriptifs_proches(taille)
+        duree_exacte, _ = chronometrer(process_similar_data, df)
+        for seuil in (SEUIL_PAR_DEFAUT, SEUIL_MINIMAL):
+            index = MinHashIndex()
+            duree, resultat = chronometrer(process_similar_data, df, seuil, index)
+            duree_index, _ = chronometrer(process_similar_data, df, seuil, index)
+            similaires = resultat['données similaires'].str.split(', ')
+            retrouves = [f"data {origine}" in similaires[ligne] for ligne, origine in origines.items()
+                         if ligne != origine and origine not in origines]
+            print(f"{taille:>8} {seuil:>6} {duree_exacte:>10.3f} {duree:>13.3f} {duree_index:>15.3f} "
+                  f"{np.mean(retrouves):>7.1%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from export_excel import create_excel_with_tables
+from generateur import generate_catalogue
+from ingestion import read_powerapp, read_source
+from validation import validate_inputs
+
+TAILLES_PAR_DEFAUT = [10_000, 100_000]
+
+
+def chronometrer(fonction, *args):
+    debut = time.perf_counter()
+    resultat = fonction(*args)
+    return resultat, time.perf_counter() - debut
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Compare la durée de la validation des fichiers d'entrée à celle de leur lecture complète."
+    )
+    parser.add_argument('--tailles', type=int, nargs='+', default=TAILLES_PAR_DEFAUT, help="Nombres de rapports")
+    args = parser.parse_args(argv)
+
+    print(f"{'rapports':>9} {'lignes Source':>14} {'validation (s)':>15} {'rejet (s)':>10} {'lecture (s)':>12}")
+    for taille in args.tailles:
+        df_powerapp, df_source = generate_catalogue(taille)
+        contenu_powerapp = create_excel_with_tables({'Table DATA': df_powerapp}).getvalue()
+        contenu_source = create_excel_with_tables({'Source': df_source}).getvalue()
+        # Même fichier Source avec une colonne obligatoire renommée et des PO Data manquants
+        df_mauvais = df_source.rename(columns={'Axe temps du rapport': 'Axe Temps du rapport'})
+        df_mauvais.loc[df_mauvais.index[::7], 'PO Data'] = None
+        contenu_mauvais = create_excel_with_tables({'Source': df_mauvais}).getvalue()
+
+        problemes, validation = chronometrer(validate_inputs, contenu_powerapp, contenu_source)
+        assert not problemes, problemes
+        problemes, rejet = chronometrer(validate_inputs, contenu_powerapp, contenu_mauvais)
+        assert problemes
+        debut = time.perf_counter()
+        read_powerapp(contenu_powerapp)
+        read_source(contenu_source)
+        lecture = time.perf_counter() - debut
+        print(f"{taille:>9} {len(df_source):>14} {validation:>15.3f} {rejet:>10.3f} {lecture:>12.2f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
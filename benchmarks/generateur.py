@@ -0,0 +1,108 @@
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from export_excel import create_excel_with_tables
+
+PRENOMS = ['Jean', 'Marie', 'Paul', 'Claire', 'Luc', 'Sophie', 'Hugo', 'Emma', 'Louis', 'Alice']
+NOMS = ['Martin', 'Bernard', 'Dubois', 'Thomas', 'Robert', 'Richard', 'Petit', 'Durand', 'Leroy', 'Moreau']
+MOTS = ['volume', 'colis', 'livraison', 'délai', 'client', 'retour', 'agence', 'tournée', 'incident', 'tarif',
+        'poids', 'distribution', 'réclamation', 'dépôt', 'plateforme', 'qualité', 'flux', 'international']
+AXES = ['Jour glissant', 'Semaine en cours', 'Mois glissant', 'Mois précédent', 'Trimestre civil',
+        'Année en cours', 'Année précédente', 'Heure par heure']
+
+
+def _libelles(rng, prefixe, nombre, nb_mots=2):
+    mots = rng.choice(MOTS, size=(nombre, nb_mots))
+    return [f"{prefixe} {' '.join(ligne)} {i}" for i, ligne in enumerate(mots)]
+
+
+def _listes(rng, vocabulaire, moyenne, nombre, taux_manquants):
+    # Listes séparées par des virgules, de longueur variable, avec des espaces et des cellules vides
+    tailles = rng.poisson(moyenne, nombre)
+    tirages = rng.integers(0, len(vocabulaire), tailles.sum())
+    separateurs = rng.choice([',', ', ', ' , '], nombre)
+    listes, debut = [], 0
+    for taille, separateur in zip(tailles, separateurs):
+        listes.append(separateur.join(vocabulaire[j] for j in tirages[debut:debut + taille]) or np.nan)
+        debut += taille
+    listes = pd.Series(listes, dtype=object)
+    listes[rng.random(nombre) < taux_manquants] = np.nan
+    return listes
+
+
+def generate_catalogue(nb_rapports, data_par_rapport=6, part_kpi=0.5, nb_data=None, nb_prompts=None,
+                       prompts_par_rapport=3, nb_po=50, taux_doublons_descriptif=0.2,
+                       taux_manquants=0.05, seed=0):
+    # Renvoie (df_powerapp, df_source) au format des fichiers 'Powerapp' (feuille 'Table DATA') et 'Source'
+    rng = np.random.default_rng(seed)
+    nb_data = nb_data or max(10, nb_rapports * data_par_rapport // 4)
+    nb_prompts = nb_prompts or max(5, nb_rapports // 20)
+
+    data = _libelles(rng, 'data', nb_data)
+    prompts = [libelle.capitalize() for libelle in _libelles(rng, 'prompt', nb_prompts, nb_mots=1)]
+    po = [f"{prenom} {nom} {i}" for i, (prenom, nom) in
+          enumerate(zip(rng.choice(PRENOMS, nb_po), rng.choice(NOMS, nb_po)))]
+
+    df_source = pd.DataFrame({
+        'Nom du rapport': _libelles(rng, 'Rapport', nb_rapports, nb_mots=3),
+        'KPI': _listes(rng, data, data_par_rapport * part_kpi, nb_rapports, taux_manquants),
+        "Maille d'analyse": _listes(rng, data, data_par_rapport * (1 - part_kpi), nb_rapports, taux_manquants),
+        'PO Data': rng.choice(po, nb_rapports),
+        'Ecran de sélection /prompt ': _listes(rng, prompts, prompts_par_rapport, nb_rapports, taux_manquants),
+        'Axe temps du rapport': rng.choice(AXES, nb_rapports),
+        'Périmètre': rng.choice(['National', 'Régional', 'Agence'], nb_rapports),
+    })
+
+    # Descriptifs : une part des DATA partage le même descriptif (données similaires)
+    nb_descriptifs = max(1, int(nb_data * (1 - taux_doublons_descriptif)))
+    descriptifs = pd.Series([f"Descriptif {i}" for i in rng.integers(0, nb_descriptifs, nb_data)], dtype=object)
+    descriptifs[rng.random(nb_data) < taux_manquants] = np.nan
+    df_powerapp = pd.DataFrame({
+        'Descriptif de la donnée': descriptifs,
+        'DATA': [f" {libelle.upper()} " for libelle in data],
+        'Qualité': rng.choice(['Certifiée', 'À valider', 'Non certifiée'], nb_data),
+        'Règles de calcul KPI': 'Somme',
+        'Descriptif KPI': 'Indicateur',
+        'Lien Wiki': 'https://wiki.example/data',
+        'Famille donnée': rng.choice(['Production', 'Client', 'Finance', 'RH'], nb_data),
+        'Commentaire': np.nan,
+    })
+    return df_powerapp, df_source
+
+
+def write_catalogue(df_powerapp, df_source, dossier, suffixe='BU Synthétique'):
+    # Écrit le couple de classeurs attendu par l'application et par batch.py
+    os.makedirs(dossier, exist_ok=True)
+    chemin_powerapp = os.path.join(dossier, f"Powerapp Dictionnaire des données {suffixe}.xlsx")
+    chemin_source = os.path.join(dossier, f"Source Dictionnaire des données {suffixe}.xlsx")
+    create_excel_with_tables({'Table DATA': df_powerapp}, output=chemin_powerapp)
+    create_excel_with_tables({'Source': df_source}, output=chemin_source)
+    return chemin_powerapp, chemin_source
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Génère un catalogue Powerapp/Source synthétique.")
+    parser.add_argument('--rapports', type=int, default=1000)
+    parser.add_argument('--data-par-rapport', type=int, default=6)
+    parser.add_argument('--prompts-par-rapport', type=int, default=3)
+    parser.add_argument('--doublons-descriptif', type=float, default=0.2)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--sortie', required=True)
+    args = parser.parse_args()
+
+    df_powerapp, df_source = generate_catalogue(
+        args.rapports, data_par_rapport=args.data_par_rapport, prompts_par_rapport=args.prompts_par_rapport,
+        taux_doublons_descriptif=args.doublons_descriptif, seed=args.seed,
+    )
+    for chemin in write_catalogue(df_powerapp, df_source, args.sortie):
+        print(chemin)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,29 @@
+import gc
+import threading
+import time
+
+from instrumentation import rss_courant
+
+
+def mesurer(fonction, *args, **kwargs):
+    # Durée et pic de RSS au-dessus du niveau de départ, échantillonné toutes les 5 ms
+    gc.collect()
+    rss_avant = rss_courant()
+    pic = [rss_avant]
+    termine = threading.Event()
+
+    def echantillonner():
+        while not termine.wait(0.005):
+            pic[0] = max(pic[0], rss_courant())
+
+    echantillonneur = threading.Thread(target=echantillonner, daemon=True)
+    echantillonneur.start()
+    debut = time.perf_counter()
+    try:
+        resultat = fonction(*args, **kwargs)
+    finally:
+        duree = time.perf_counter() - debut
+        termine.set()
+        echantillonneur.join()
+    pic[0] = max(pic[0], rss_courant())
+    return resultat, {'duree_s': duree, 'pic_rss_mo': (pic[0] - rss_avant) / 2 ** 20}
@@ -0,0 +1,132 @@
+import hashlib
+import logging
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+TAILLE_PAR_DEFAUT = 32
+TTL_PAR_DEFAUT = 3600
+
+
+def content_hash(*contenus):
+    # Empreinte SHA-256 d'un ou plusieurs contenus (bytes ou str)
+    empreinte = hashlib.sha256()
+    for contenu in contenus:
+        if isinstance(contenu, str):
+            contenu = contenu.encode('utf-8')
+        empreinte.update(len(contenu).to_bytes(8, 'little'))
+        empreinte.update(contenu)
+    return empreinte.hexdigest()
+
+
+class ResultCache:
+    # Cache LRU borné en taille, avec expiration (TTL) et persistance optionnelle sur disque.
+    # Les valeurs sont partagées : l'appelant doit copier les DataFrames qu'il modifie.
+
+    def __init__(self, max_entries=TAILLE_PAR_DEFAUT, ttl_seconds=TTL_PAR_DEFAUT, directory=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.directory = directory
+        self._entrees = OrderedDict()
+        self._verrou = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _expire(self, horodatage):
+        return self.ttl_seconds is not None and time.time() - horodatage > self.ttl_seconds
+
+    def _chemin(self, cle):
+        return os.path.join(self.directory, f"{content_hash(repr(cle))}.pkl")
+
+    def _lire_disque(self, cle):
+        chemin = self._chemin(cle)
+        try:
+            with open(chemin, 'rb') as fichier:
+                horodatage, valeur = pickle.load(fichier)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logging.warning(f"Entrée de cache illisible {chemin} : {e}")
+            self._supprimer_disque(cle)
+            return None
+        if self._expire(horodatage):
+            self._supprimer_disque(cle)
+            return None
+        return horodatage, valeur
+
+    def _ecrire_disque(self, cle, horodatage, valeur):
+        chemin = self._chemin(cle)
+        temporaire = f"{chemin}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temporaire, 'wb') as fichier:
+                pickle.dump((horodatage, valeur), fichier, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporaire, chemin)
+        except Exception as e:
+            logging.warning(f"Impossible d'écrire l'entrée de cache {chemin} : {e}")
+            if os.path.exists(temporaire):
+                os.remove(temporaire)
+
+    def _supprimer_disque(self, cle):
+        try:
+            os.remove(self._chemin(cle))
+        except FileNotFoundError:
+            pass
+
+    def _evincer(self):
+        while len(self._entrees) > self.max_entries:
+            cle, _ = self._entrees.popitem(last=False)
+            if self.directory:
+                self._supprimer_disque(cle)
+
+    def get(self, cle, defaut=None):
+        with self._verrou:
+            entree = self._entrees.get(cle)
+            if entree is not None:
+                horodatage, valeur = entree
+                if not self._expire(horodatage):
+                    self._entrees.move_to_end(cle)
+                    return valeur
+                del self._entrees[cle]
+                if self.directory:
+                    self._supprimer_disque(cle)
+                return defaut
+
+            if self.directory:
+                entree = self._lire_disque(cle)
+                if entree is not None:
+                    self._entrees[cle] = entree
+                    self._evincer()
+                    return entree[1]
+        return defaut
+
+    def set(self, cle, valeur):
+        horodatage = time.time()
+        with self._verrou:
+            self._entrees[cle] = (horodatage, valeur)
+            self._entrees.move_to_end(cle)
+            self._evincer()
+        if self.directory:
+            self._ecrire_disque(cle, horodatage, valeur)
+
+    def get_or_compute(self, cle, fonction):
+        valeur = self.get(cle)
+        if valeur is None:
+            valeur = fonction()
+            self.set(cle, valeur)
+        return valeur
+
+    def clear(self):
+        with self._verrou:
+            self._entrees.clear()
+        if self.directory:
+            for nom in os.listdir(self.directory):
+                if nom.endswith('.pkl'):
+                    os.remove(os.path.join(self.directory, nom))
+
+    def __contains__(self, cle):
+        return self.get(cle) is not None
+
+    def __len__(self):
+        return len(self._entrees)
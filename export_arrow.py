@@ -0,0 +1,106 @@
+import shutil
+import zipfile
+from io import BytesIO
+
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+
+# Une table par fichier dans l'archive zip : un fichier Parquet ou Arrow IPC ne porte qu'un seul schéma
+EXTENSIONS = {'parquet': '.parquet', 'arrow': '.arrow'}
+
+
+def _table_arrow(df):
+    df = df.rename(columns=str)
+    try:
+        return pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError):
+        pass
+    # Colonnes aux types mélangés (ex. nombres et textes saisis dans la même colonne Excel) :
+    # les valeurs renseignées sont écrites en texte
+    df = df.copy()
+    for colonne in df.select_dtypes(include='object').columns:
+        try:
+            pa.array(df[colonne], from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError):
+            df[colonne] = df[colonne].where(df[colonne].isna(), df[colonne].astype(str))
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+
+def _ecrire_table(flux, df, format):
+    table = _table_arrow(df)
+    if format == 'parquet':
+        pq.write_table(table, flux)
+    else:
+        with ipc.new_file(flux, table.schema, options=ipc.IpcWriteOptions(compression='zstd')) as writer:
+            writer.write_table(table)
+
+
+def create_columnar_archive(sheets, output=None, format='parquet'):
+    # Archive zip contenant une table Parquet ou Arrow IPC par feuille, dans l'ordre des feuilles.
+    # Les tables sont déjà compressées : les membres du zip sont stockés sans recompression.
+    if format not in EXTENSIONS:
+        raise ValueError(f"Format inconnu '{format}' (attendu : {', '.join(EXTENSIONS)})")
+    if output is None:
+        output = BytesIO()
+
+    with zipfile.ZipFile(output, 'w', zipfile.ZIP_STORED) as archive:
+        for sheet_name, df in sheets.items():
+            with archive.open(f"{sheet_name}{EXTENSIONS[format]}", 'w') as flux:
+                _ecrire_table(flux, df, format)
+
+    if hasattr(output, 'seek'):
+        output.seek(0)
+    return output
+
+
+def archive_format(contenu):
+    # Format des tables d'une archive produite par create_columnar_archive, None pour un autre fichier (xlsx compris)
+    if not zipfile.is_zipfile(BytesIO(contenu)):
+        return None
+    with zipfile.ZipFile(BytesIO(contenu)) as archive:
+        noms = archive.namelist()
+    for format, extension in EXTENSIONS.items():
+        if noms and all(nom.endswith(extension) for nom in noms):
+            return format
+    return None
+
+
+def read_columnar_table(flux, format):
+    if format == 'parquet':
+        table = pq.read_table(flux)
+    else:
+        table = ipc.open_file(flux).read_all()
+    return table.to_pandas()
+
+
+def read_columnar_columns(flux, format):
+    # Noms des colonnes d'une table, lus dans son schéma sans décoder les données
+    if format == 'parquet':
+        return pq.read_schema(flux).names
+    return ipc.open_file(flux).schema.names
+
+
+def replace_table(contenu, sheet_name, df, output=None):
+    # Réécrit uniquement la table `sheet_name` : les autres membres de l'archive sont recopiés sans être décodés
+    format = archive_format(contenu)
+    if format is None:
+        raise ValueError("Le fichier n'est pas une archive de tables Parquet ou Arrow.")
+    if output is None:
+        output = BytesIO()
+
+    nom_table = f"{sheet_name}{EXTENSIONS[format]}"
+    with zipfile.ZipFile(BytesIO(contenu)) as archive_entree, \
+            zipfile.ZipFile(output, 'w', zipfile.ZIP_STORED) as archive_sortie:
+        noms = archive_entree.namelist()
+        for nom in noms if nom_table in noms else noms + [nom_table]:
+            with archive_sortie.open(nom, 'w') as flux:
+                if nom == nom_table:
+                    _ecrire_table(flux, df, format)
+                else:
+                    with archive_entree.open(nom) as source:
+                        shutil.copyfileobj(source, flux)
+
+    if hasattr(output, 'seek'):
+        output.seek(0)
+    return output
@@ -0,0 +1,219 @@
+import itertools
+import math
+import posixpath
+import re
+import shutil
+import warnings
+import zipfile
+from datetime import date, time, timedelta
+from io import BytesIO
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+
+from openpyxl import Workbook
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+from openpyxl.utils import get_column_letter
+from openpyxl.worksheet.filters import AutoFilter
+from openpyxl.worksheet.table import Table, TableColumn, TableStyleInfo
+from openpyxl.xml.constants import SHEET_MAIN_NS
+from openpyxl.xml.functions import tostring
+
+TAILLE_BLOC = 10_000
+
+NS_RELATIONS_DOCUMENT = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+NS_RELATIONS_PAQUET = 'http://schemas.openxmlformats.org/package/2006/relationships'
+TYPE_RELATION_TABLE = f'{NS_RELATIONS_DOCUMENT}/table'
+
+SHEET_DATA_RE = re.compile(r'<(\w+:)?sheetData\b[^>]*?(?:/>|>.*?</\1?sheetData>)', re.S)
+NOM_TABLE_INVALIDE_RE = re.compile(r'\W')
+DIMENSION_RE = re.compile(r'(<(?:\w+:)?dimension\b[^>]*?\bref=")[^"]*(")')
+FORMULE_RE = re.compile(r'<(?:\w+:)?f[\s/>]')
+
+
+def iter_rows(df, taille_bloc=TAILLE_BLOC):
+    # Conversion par blocs : seules `taille_bloc` lignes sont converties en objets Python à la fois
+    for debut in range(0, len(df), taille_bloc):
+        bloc = df.iloc[debut:debut + taille_bloc]
+        valeurs = bloc.astype(object).where(bloc.notna(), None)
+        yield from valeurs.itertuples(index=False, name=None)
+
+
+def create_table(sheet_name, columns, nb_rows):
+    # Définir la plage de données (toutes les lignes et colonnes du DataFrame, +1 pour l'en-tête)
+    ref = f"A1:{get_column_letter(len(columns))}{nb_rows + 1}"
+    # Un nom de tableau Excel ne peut contenir ni espace ni ponctuation
+    table = Table(displayName=f"Table_{NOM_TABLE_INVALIDE_RE.sub('_', sheet_name)}", ref=ref)
+    # En mode écriture seule, les en-têtes ne peuvent pas être relus depuis la feuille
+    table.tableColumns = [TableColumn(id=i + 1, name=nom) for i, nom in enumerate(columns)]
+    table.autoFilter = AutoFilter(ref=ref)
+    # Définir le style du tableau
+    table.tableStyleInfo = TableStyleInfo(name="TableStyleMedium9", showFirstColumn=False,
+                                          showLastColumn=False, showRowStripes=True, showColumnStripes=False)
+    return table
+
+
+def create_excel_with_tables(sheets, *, output=None):
+    # Écriture en flux (mode write_only d'openpyxl) : mémoire constante quelle que soit la taille
+    if output is None:
+        output = BytesIO()
+
+    workbook = Workbook(write_only=True)
+    for sheet_name, df in sheets.items():
+        worksheet = workbook.create_sheet(title=sheet_name)
+        columns = [str(col) for col in df.columns]
+        with warnings.catch_warnings():
+            # Les colonnes du tableau sont renseignées par create_table
+            warnings.filterwarnings('ignore', message='In write-only mode you must add table columns manually')
+            worksheet.add_table(create_table(sheet_name, columns, df.shape[0]))
+        worksheet.append(columns)
+        for row in iter_rows(df):
+            worksheet.append(row)
+
+    workbook.save(output)
+    if hasattr(output, 'seek'):
+        output.seek(0)
+    return output
+
+
+def _chemin_relations(partie):
+    dossier, nom = posixpath.split(partie)
+    return posixpath.join(dossier, '_rels', f"{nom}.rels")
+
+
+def _resoudre(partie_source, cible):
+    if cible.startswith('/'):
+        return cible.lstrip('/')
+    return posixpath.normpath(posixpath.join(posixpath.dirname(partie_source), cible))
+
+
+def _relations(archive, partie):
+    arbre = ElementTree.fromstring(archive.read(_chemin_relations(partie)))
+    return {
+        relation.get('Id'): (relation.get('Type'), _resoudre(partie, relation.get('Target')))
+        for relation in arbre.iter(f'{{{NS_RELATIONS_PAQUET}}}Relationship')
+    }
+
+
+def workbook_parts(archive):
+    # Feuilles du classeur (nom -> partie XML, dans l'ordre du classeur) et parties du paquet
+    # (type de relation -> partie : classeur, styles, chaînes partagées...)
+    racine = {type_: cible for type_, cible in _relations(archive, '').values()}
+    partie_classeur = racine[f'{NS_RELATIONS_DOCUMENT}/officeDocument']
+    relations_classeur = _relations(archive, partie_classeur)
+
+    classeur = ElementTree.fromstring(archive.read(partie_classeur))
+    feuilles = {
+        feuille.get('name'): relations_classeur[feuille.get(f'{{{NS_RELATIONS_DOCUMENT}}}id')][1]
+        for feuille in classeur.iter(f'{{{SHEET_MAIN_NS}}}sheet')
+    }
+    return feuilles, {**racine, **{type_: cible for type_, cible in relations_classeur.values()}}
+
+
+def _localiser_feuille(archive, sheet_name):
+    # Parties du paquet OOXML correspondant à la feuille et à son tableau
+    feuilles, _ = workbook_parts(archive)
+    if sheet_name not in feuilles:
+        raise ValueError(f"La feuille '{sheet_name}' n'existe pas dans le fichier.")
+    partie_feuille = feuilles[sheet_name]
+
+    try:
+        relations_feuille = _relations(archive, partie_feuille)
+    except KeyError:
+        relations_feuille = {}
+    tables = [cible for type_, cible in relations_feuille.values() if type_ == TYPE_RELATION_TABLE]
+    if len(tables) != 1:
+        raise ValueError(f"La feuille '{sheet_name}' doit contenir exactement un tableau.")
+    return partie_feuille, tables[0]
+
+
+def _cellule_xml(ref, valeur):
+    # Les flottants infinis n'ont pas de représentation valide dans une cellule : la cellule est laissée vide
+    if isinstance(valeur, float) and not math.isfinite(valeur):
+        return ''
+    if isinstance(valeur, bool):
+        return f'<c r="{ref}" t="b"><v>{int(valeur)}</v></c>'
+    if isinstance(valeur, (int, float)):
+        return f'<c r="{ref}"><v>{valeur!r}</v></c>'
+    texte = escape(ILLEGAL_CHARACTERS_RE.sub('', str(valeur)))
+    return f'<c r="{ref}" t="inlineStr"><is><t xml:space="preserve">{texte}</t></is></c>'
+
+
+def _sheet_data_xml(df, columns):
+    # Lignes de la feuille en chaînes inline : aucune dépendance aux sharedStrings du classeur
+    lettres = [get_column_letter(i + 1) for i in range(len(columns))]
+    yield '<sheetData>'
+    for numero, ligne in enumerate(itertools.chain([columns], iter_rows(df)), start=1):
+        cellules = ''.join(_cellule_xml(f"{lettre}{numero}", valeur)
+                           for lettre, valeur in zip(lettres, ligne) if valeur is not None)
+        yield f'<row r="{numero}">{cellules}</row>'
+    yield '</sheetData>'
+
+
+def _contient_dates(df):
+    # Les dates ont besoin d'un format défini dans les styles du classeur d'origine
+    if len(df.select_dtypes(include=['datetime', 'datetimetz', 'timedelta']).columns):
+        return True
+    return any(
+        isinstance(valeur, (date, time, timedelta))
+        for colonne in df.select_dtypes(include='object').columns
+        for valeur in df[colonne]
+    )
+
+
+def _table_xml(table_xml, sheet_name, columns, nb_rows):
+    # Même identifiant et même nom que le tableau d'origine, seules la plage et les colonnes changent
+    table = Table.from_tree(ElementTree.fromstring(table_xml))
+    nouvelle = create_table(sheet_name, columns, nb_rows)
+    table.ref = nouvelle.ref
+    table.autoFilter = nouvelle.autoFilter
+    table.tableColumns = nouvelle.tableColumns
+    if table.tableStyleInfo is None:
+        table.tableStyleInfo = nouvelle.tableStyleInfo
+    arbre = table.to_tree()
+    arbre.set('xmlns', SHEET_MAIN_NS)
+    return tostring(arbre)
+
+
+def replace_sheet(contenu, sheet_name, df, output=None):
+    # Réécrit uniquement la feuille `sheet_name` et son tableau dans le zip xlsx :
+    # les autres parties sont recopiées à l'identique, sans être décodées
+    if output is None:
+        output = BytesIO()
+    if _contient_dates(df):
+        raise ValueError(f"La feuille '{sheet_name}' contient des dates : réécriture complète requise.")
+
+    columns = [str(col) for col in df.columns]
+    with zipfile.ZipFile(BytesIO(contenu)) as archive_entree:
+        partie_feuille, partie_table = _localiser_feuille(archive_entree, sheet_name)
+        feuille_xml = archive_entree.read(partie_feuille).decode('utf-8')
+        correspondance = SHEET_DATA_RE.search(feuille_xml)
+        if correspondance is None or correspondance.group(1):
+            raise ValueError(f"Structure de la feuille '{sheet_name}' non prise en charge.")
+        # Les formules seraient remplacées par leurs valeurs alors que calcChain.xml, recopié, y fait
+        # toujours référence : Excel signalerait un fichier corrompu
+        if FORMULE_RE.search(correspondance.group(0)):
+            raise ValueError(f"La feuille '{sheet_name}' contient des formules : réécriture complète requise.")
+        ref = f"A1:{get_column_letter(len(columns))}{df.shape[0] + 1}"
+        debut = DIMENSION_RE.sub(lambda m: f"{m.group(1)}{ref}{m.group(2)}", feuille_xml[:correspondance.start()])
+        fin = feuille_xml[correspondance.end():]
+        table_xml = _table_xml(archive_entree.read(partie_table), sheet_name, columns, df.shape[0])
+
+        with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as archive_sortie:
+            for info in archive_entree.infolist():
+                if info.filename == partie_feuille:
+                    info_feuille = zipfile.ZipInfo(info.filename, info.date_time)
+                    info_feuille.compress_type = zipfile.ZIP_DEFLATED
+                    with archive_sortie.open(info_feuille, 'w') as flux:
+                        flux.write(debut.encode('utf-8'))
+                        for morceau in _sheet_data_xml(df, columns):
+                            flux.write(morceau.encode('utf-8'))
+                        flux.write(fin.encode('utf-8'))
+                elif info.filename == partie_table:
+                    archive_sortie.writestr(info, table_xml)
+                else:
+                    with archive_entree.open(info) as source, archive_sortie.open(info, 'w') as flux:
+                        shutil.copyfileobj(source, flux)
+
+    if hasattr(output, 'seek'):
+        output.seek(0)
+    return output
@@ -0,0 +1,228 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+NUMERO_ID_RE = re.compile(r'(\d+)$')
+# Mélange des codes de colonnes dans le haché d'une ligne (multiplicateur FNV 64 bits)
+MULTIPLICATEUR_HACHE = np.uint64(0x100000001B3)
+
+
+def id_number(identifiant, prefixe=''):
+    # Compteur qui suit le préfixe de l'identifiant ('DATA0042' -> 42, 'JP60007' avec 'JP6' -> 7)
+    identifiant = str(identifiant)
+    if prefixe and identifiant.startswith(prefixe) and identifiant[len(prefixe):].isdigit():
+        return int(identifiant[len(prefixe):])
+    correspondance = NUMERO_ID_RE.search(identifiant)
+    return int(correspondance.group(1)) if correspondance else 0
+
+
+def _codes_et_valeurs(serie):
+    # Codes entiers et valeurs distinctes d'une série (NaN compris) ; une catégorie fournit directement les siens
+    if not isinstance(serie.dtype, pd.CategoricalDtype):
+        codes, valeurs = pd.factorize(serie, use_na_sentinel=False)
+        return codes, pd.Series(valeurs)
+    codes = serie.cat.codes.to_numpy().astype(np.int64)
+    valeurs = pd.Series(serie.cat.categories)
+    if (codes < 0).any():
+        codes[codes < 0] = len(valeurs)
+        valeurs = pd.concat([valeurs, pd.Series([np.nan], dtype=valeurs.dtype)], ignore_index=True)
+    return codes, valeurs
+
+
+def _codes_communs(*series, vides_manquants=False):
+    # Codes entiers partagés par plusieurs séries : une même valeur reçoit le même code dans chacune.
+    # Seules les valeurs distinctes de chaque série sont rapprochées, sans conversion en objets Python.
+    # Avec `vides_manquants`, chaînes vides et valeurs manquantes sont confondues (code -1) ;
+    # sinon NaN est une valeur comme une autre.
+    series = [pd.Series(serie).reset_index(drop=True) for serie in series]
+    if len({serie.dtype for serie in series}) == 1 and not isinstance(series[0].dtype, pd.CategoricalDtype):
+        # Même type de part et d'autre : un seul codage de la concaténation
+        codes, valeurs = [np.arange(len(serie)) for serie in series], series
+    else:
+        codes, valeurs = zip(*(_codes_et_valeurs(serie) for serie in series))
+    non_vides = [serie for serie in valeurs if len(serie)] or [valeurs[0]]
+    codes_valeurs, uniques = pd.factorize(pd.concat(non_vides, ignore_index=True), use_na_sentinel=vides_manquants)
+    if vides_manquants:
+        codes_valeurs[codes_valeurs == pd.Index(uniques).get_indexer([''])[0]] = -1
+    debuts = np.cumsum([0] + [len(serie) for serie in valeurs])
+    return [codes_valeurs[debut:debut + len(serie)][codes_serie] if len(serie) else codes_serie
+            for debut, serie, codes_serie in zip(debuts, valeurs, codes)], pd.Index(uniques)
+
+
+def _rangs(codes):
+    # Rang de chaque élément parmi ceux de même code, dans l'ordre d'origine
+    rangs = np.zeros(len(codes), dtype=np.int64)
+    if len(codes):
+        ordre = np.argsort(codes, kind='stable')
+        tries = codes[ordre]
+        positions = np.arange(len(codes))
+        debuts = np.where(np.r_[True, tries[1:] != tries[:-1]], positions, 0)
+        rangs[ordre] = positions - np.maximum.accumulate(debuts)
+    return rangs
+
+
+def _numero_max(cles, identifiants, prefixe):
+    # Plus grand compteur des identifiants existants (0 s'il n'y en a pas). Les chiffres finaux suffisent,
+    # sauf quand le préfixe de la clé se termine lui-même par un chiffre : id_number tranche alors.
+    if len(identifiants) == 0:
+        return 0
+    identifiants = pd.Series(identifiants).astype(str).reset_index(drop=True)
+    chiffres = identifiants.str.replace(r'^.*?(\d*)$', r'\1', regex=True)
+    numeros = np.array(chiffres.where(chiffres != '', '0').astype(np.int64))
+    codes, uniques = pd.factorize(pd.Series(cles), use_na_sentinel=False)
+    prefixes = [prefixe(cle) for cle in uniques.tolist()]
+    ambigus = np.flatnonzero(np.array([prefixe_cle[-1:].isdigit() for prefixe_cle in prefixes], dtype=bool)[codes])
+    numeros[ambigus] = [id_number(identifiants.iloc[position], prefixes[codes[position]]) for position in ambigus]
+    return int(numeros.max())
+
+
+def rows_in(valeurs, ensemble):
+    # Masque des valeurs présentes dans `ensemble`
+    (codes, codes_ensemble), uniques = _codes_communs(valeurs, ensemble)
+    presentes = np.zeros(len(uniques), dtype=bool)
+    presentes[codes_ensemble] = True
+    return presentes[codes]
+
+
+def stabilize_ids(df, colonne_cle, colonne_id, df_precedent, prefixe):
+    # Reprend l'identifiant de l'export précédent pour les clés déjà connues ; les nouvelles clés
+    # reçoivent `prefixe(cle)` suivi d'un compteur sur 4 chiffres qui prolonge l'existant
+    df = df.copy()
+    if df_precedent is None or not {colonne_cle, colonne_id} <= set(df_precedent.columns):
+        df_precedent = pd.DataFrame({colonne_cle: [], colonne_id: []}, dtype=object)
+    df_precedent = df_precedent.dropna(subset=[colonne_id])
+
+    # Une même clé peut apparaître plusieurs fois (ex. DATA en double dans le Powerapp) :
+    # chaque occurrence est distinguée par son rang
+    (cles, cles_precedentes), _ = _codes_communs(df[colonne_cle], df_precedent[colonne_cle])
+    rangs, rangs_precedents = _rangs(cles), _rangs(cles_precedentes)
+    base = max(rangs.max(initial=0), rangs_precedents.max(initial=0)) + 1
+    positions = pd.Index(cles_precedentes * base + rangs_precedents).get_indexer(cles * base + rangs)
+    ids = np.full(len(df), None, dtype=object)
+    connues = positions >= 0
+    ids[connues] = df_precedent[colonne_id].to_numpy(dtype=object)[positions[connues]]
+
+    nouvelles = np.flatnonzero(positions < 0)
+    if len(nouvelles):
+        numero = _numero_max(df_precedent[colonne_cle], df_precedent[colonne_id], prefixe)
+        cles_nouvelles = df[colonne_cle].to_numpy(dtype=object)[nouvelles]
+        ids[nouvelles] = [prefixe(cle) + str(numero + rang).zfill(4) for rang, cle in enumerate(cles_nouvelles, 1)]
+    df[colonne_id] = ids.tolist()
+    return df
+
+
+def _empreintes_rapports(codes_rapport, codes_colonnes, nb_rapports):
+    # Empreinte de chaque rapport : somme des hachés de ses lignes (valeurs et rang de la ligne dans le rapport,
+    # pour qu'une permutation de ses lignes compte comme une modification) et nombre de lignes
+    haches = np.zeros(len(codes_rapport), dtype=np.uint64)
+    for codes in codes_colonnes:
+        haches = haches * MULTIPLICATEUR_HACHE ^ pd.util.hash_array(codes.astype(np.int64))
+    haches = pd.util.hash_array(haches ^ _rangs(codes_rapport).astype(np.uint64))
+
+    sommes = np.zeros(nb_rapports, dtype=np.uint64)
+    if len(codes_rapport):
+        ordre = np.argsort(codes_rapport, kind='stable')
+        tries = codes_rapport[ordre]
+        debuts = np.flatnonzero(np.r_[True, tries[1:] != tries[:-1]])
+        sommes[tries[debuts]] = np.add.reduceat(haches[ordre], debuts)
+    return sommes, np.bincount(codes_rapport, minlength=nb_rapports)
+
+
+def diff_reports(df_source, df_rapport_precedent, colonne_rapport='Nom du rapport'):
+    # Répartit les rapports du source entre ceux à recalculer (ajoutés ou modifiés) et ceux inchangés.
+    # Les deux tables sont codées ensemble, colonne par colonne : aucune valeur n'est convertie en texte.
+    colonnes = list(df_source.columns)
+    if df_rapport_precedent is None or not set(colonnes) <= set(df_rapport_precedent.columns):
+        return pd.Index(pd.unique(df_source[colonne_rapport])), pd.Index([])
+
+    (rapports_source, rapports_precedents), rapports = _codes_communs(
+        df_source[colonne_rapport], df_rapport_precedent[colonne_rapport])
+    codes_source, codes_precedents = zip(*(
+        _codes_communs(df_source[colonne], df_rapport_precedent[colonne], vides_manquants=True)[0]
+        for colonne in colonnes))
+    sommes, lignes = _empreintes_rapports(rapports_source, codes_source, len(rapports))
+    sommes_precedentes, lignes_precedentes = _empreintes_rapports(rapports_precedents, codes_precedents, len(rapports))
+
+    inchanges = (lignes > 0) & (lignes == lignes_precedentes) & (sommes == sommes_precedentes)
+    return pd.Index(rapports[(lignes > 0) & ~inchanges]), pd.Index(rapports[inchanges])
+
+
+def updated_keys(cles_precedentes, cles_reprises, cles_nouvelles):
+    # Clés d'une table de référence après mise à jour : masque des clés de l'export précédent encore utilisées
+    # (par les lignes reprises ou recalculées), et clés apparues dans les lignes recalculées, dans leur ordre
+    (precedentes, reprises, nouvelles), cles = _codes_communs(cles_precedentes, cles_reprises, cles_nouvelles)
+    utilisees = np.zeros(len(cles), dtype=bool)
+    utilisees[reprises] = True
+    utilisees[nouvelles] = True
+    connues = np.zeros(len(cles), dtype=bool)
+    connues[precedentes] = True
+    return utilisees[precedentes], cles[pd.unique(nouvelles[~connues[nouvelles]])]
+
+
+def source_lines(rapports_source, rapports_precedents, unites, groupes=None):
+    # Ligne du source de chaque ligne reprise d'un rapport inchangé. Un rapport d'une seule ligne y renvoie
+    # directement ; sinon la k-ième ligne du rapport (et du groupe, ex. la colonne d'un prompt) dans l'export
+    # précédent vient de sa k-ième unité dans le source. `unites(lignes)` découpe ces lignes du source
+    # en unités (jetons, prompts) et renvoie (ligne, groupe ou None) de chacune.
+    (codes_source, codes), rapports = _codes_communs(rapports_source, rapports_precedents)
+    nb_lignes = np.bincount(codes_source, minlength=len(rapports))
+    if (nb_lignes[codes] == 0).any():
+        raise ValueError("Les lignes du fichier transformé précédent ne correspondent pas aux rapports inchangés du source")
+    premieres = np.zeros(len(rapports), dtype=np.int64)
+    premieres[codes_source[::-1]] = np.arange(len(codes_source))[::-1]
+    lignes = premieres[codes]
+
+    multiples = nb_lignes[codes] > 1
+    if multiples.any():
+        concernes = np.zeros(len(rapports), dtype=bool)
+        concernes[codes[multiples]] = True
+        lignes_unites, groupes_unites = unites(np.flatnonzero(concernes[codes_source]))
+        codes, codes_unites = codes[multiples], codes_source[lignes_unites]
+        groupes = np.zeros(len(codes), dtype=np.int64) if groupes is None else groupes[multiples]
+        groupes_unites = np.zeros(len(codes_unites), dtype=np.int64) if groupes_unites is None else groupes_unites
+        ordre = np.lexsort((groupes, codes))
+        ordre_unites = np.lexsort((groupes_unites, codes_unites))
+        if (len(ordre) != len(ordre_unites) or (codes[ordre] != codes_unites[ordre_unites]).any()
+                or (groupes[ordre] != groupes_unites[ordre_unites]).any()):
+            raise ValueError("Les lignes du fichier transformé précédent ne correspondent pas aux rapports inchangés du source")
+        lignes_multiples = np.empty(len(codes), dtype=np.int64)
+        lignes_multiples[ordre] = lignes_unites[ordre_unites]
+        lignes[multiples] = lignes_multiples
+    return lignes
+
+
+def _types_communs(df_precedent, df_nouveau):
+    # Colonnes alignées avant concaténation pour que pd.concat ne convertisse pas toute la colonne en objets
+    # Python : libellés manquants ajoutés aux catégories de l'export précédent, ou texte si celui-ci est en texte
+    precedentes, nouvelles = {}, {}
+    for colonne in df_nouveau.columns:
+        gauche, droite = df_precedent[colonne], df_nouveau[colonne]
+        if gauche.dtype == droite.dtype:
+            continue
+        if isinstance(gauche.dtype, pd.CategoricalDtype):
+            libelles = droite.cat.categories if isinstance(droite.dtype, pd.CategoricalDtype) else pd.Index(droite.dropna().unique())
+            ajouts = libelles.difference(gauche.cat.categories, sort=False)
+            if len(ajouts):
+                gauche = precedentes[colonne] = pd.Series(pd.Categorical.from_codes(
+                    gauche.cat.codes.to_numpy(), dtype=pd.CategoricalDtype(gauche.cat.categories.append(ajouts))),
+                    index=gauche.index)
+            nouvelles[colonne] = droite.astype(gauche.dtype)
+        elif isinstance(droite.dtype, pd.CategoricalDtype) and pd.api.types.is_string_dtype(gauche.dtype):
+            nouvelles[colonne] = droite.astype(gauche.dtype)
+    return df_precedent.assign(**precedentes), df_nouveau.assign(**nouvelles)
+
+
+def merge_report_rows(df_precedent, df_nouveau, lignes, groupes=None):
+    # Lignes reprises de l'export précédent pour les rapports inchangés, suivies des lignes recalculées, remises
+    # dans l'ordre de main_etl : par ligne du source, ou par groupe puis par ligne (1ers prompts, puis 2es, etc.)
+    colonnes = list(df_nouveau.columns) if len(df_nouveau.columns) else list(df_precedent.columns)
+    df_precedent = df_precedent.reindex(columns=colonnes)
+    if len(df_nouveau) == 0:
+        resultat = df_precedent.reset_index(drop=True)
+    else:
+        resultat = pd.concat(_types_communs(df_precedent, df_nouveau), ignore_index=True)
+    ordre = np.lexsort((lignes,) if groupes is None else (lignes, groupes))
+    if (np.diff(ordre) > 0).all():
+        return resultat
+    return resultat.iloc[ordre].reset_index(drop=True)
@@ -0,0 +1,350 @@
+import warnings
+import zipfile
+from abc import ABC, abstractmethod
+from collections.abc import MutableMapping
+from io import BytesIO
+from xml.etree import ElementTree
+
+import numpy as np
+import pandas as pd
+from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format, is_timedelta_format
+from openpyxl.utils import column_index_from_string
+from openpyxl.utils.datetime import CALENDAR_MAC_1904, CALENDAR_WINDOWS_1900, from_excel, from_ISO8601
+from openpyxl.xml.constants import SHEET_MAIN_NS
+
+from export_arrow import EXTENSIONS, archive_format, read_columnar_table
+from export_excel import NS_RELATIONS_DOCUMENT, workbook_parts
+
+FEUILLE_POWERAPP = 'Table DATA'
+
+# Colonnes du fichier Powerapp utilisées par l'ETL
+COLONNES_POWERAPP = ["Descriptif de la donnée", "DATA", "Qualité", "Règles de calcul KPI",
+                     "Descriptif KPI", "Lien Wiki", "Famille donnée"]
+
+# Colonnes du fichier Source lues par les traitements (les autres sont reprises telles quelles dans Table_Rapport)
+COLONNES_SOURCE = ['Nom du rapport', 'KPI', "Maille d'analyse", 'PO Data',
+                   'Ecran de sélection /prompt ', 'Axe temps du rapport']
+
+# Valeurs interprétées comme vides, identiques aux valeurs par défaut de pd.read_excel
+VALEURS_VIDES = {'', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND',
+                 '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'}
+
+
+TYPE_RELATION_CLASSEUR = f'{NS_RELATIONS_DOCUMENT}/officeDocument'
+TYPE_RELATION_CHAINES = f'{NS_RELATIONS_DOCUMENT}/sharedStrings'
+TYPE_RELATION_STYLES = f'{NS_RELATIONS_DOCUMENT}/styles'
+BALISE_LIGNE = f'{{{SHEET_MAIN_NS}}}row'
+BALISE_CELLULE = f'{{{SHEET_MAIN_NS}}}c'
+BALISE_VALEUR = f'{{{SHEET_MAIN_NS}}}v'
+BALISE_TEXTE = f'{{{SHEET_MAIN_NS}}}t'
+BALISE_TEXTE_EN_LIGNE = f'{{{SHEET_MAIN_NS}}}is'
+BALISE_CHAINE = f'{{{SHEET_MAIN_NS}}}si'
+BALISE_SEGMENT = f'{{{SHEET_MAIN_NS}}}r'
+CHIFFRES = '0123456789'
+
+
+def _ouvrir(source):
+    if isinstance(source, (bytes, bytearray)):
+        source = BytesIO(source)
+    return zipfile.ZipFile(source)
+
+
+def _texte(element):
+    # Texte d'une chaîne partagée ou en ligne : texte simple et segments enrichis (la phonétique est ignorée)
+    morceaux = []
+    for enfant in element:
+        if enfant.tag == BALISE_TEXTE:
+            morceaux.append(enfant.text or '')
+        elif enfant.tag == BALISE_SEGMENT:
+            morceaux.extend(t.text or '' for t in enfant if t.tag == BALISE_TEXTE)
+    return ''.join(morceaux)
+
+
+def _formats_dates(archive, partie_styles):
+    # Indices de style (attribut s des cellules) dont le format est une date, et parmi eux ceux d'une durée
+    if partie_styles is None:
+        return set(), set()
+    styles = ElementTree.fromstring(archive.read(partie_styles))
+    formats = dict(BUILTIN_FORMATS)
+    formats.update({int(format_.get('numFmtId')): format_.get('formatCode')
+                    for format_ in styles.iter(f'{{{SHEET_MAIN_NS}}}numFmt')})
+    xfs = styles.find(f'{{{SHEET_MAIN_NS}}}cellXfs')
+    codes = [formats.get(int(xf.get('numFmtId', 0))) or '' for xf in (xfs if xfs is not None else [])]
+    return ({indice for indice, code in enumerate(codes) if is_date_format(code)},
+            {indice for indice, code in enumerate(codes) if is_timedelta_format(code)})
+
+
+class SharedStrings:
+    # Chaînes partagées décodées à la demande, dans l'ordre du fichier : la lecture s'arrête
+    # à la plus grande chaîne demandée
+
+    def __init__(self, archive, partie):
+        self._chaines = []
+        self._elements = self._lire(archive, partie) if partie is not None else iter(())
+
+    @staticmethod
+    def _lire(archive, partie):
+        with archive.open(partie) as flux:
+            for _, element in ElementTree.iterparse(flux):
+                if element.tag == BALISE_CHAINE:
+                    yield _texte(element).replace('x005F_', '')
+                    element.clear()
+
+    def __getitem__(self, indice):
+        while len(self._chaines) <= indice:
+            chaine = next(self._elements, None)
+            if chaine is None:
+                break
+            self._chaines.append(chaine)
+        return self._chaines[indice]
+
+
+class SheetReader:
+    # Lecture en flux d'une feuille xlsx, avec les mêmes valeurs qu'openpyxl en lecture seule (data_only) ;
+    # seules les cellules des colonnes demandées sont décodées
+
+    def __init__(self, archive, sheet_name=0):
+        feuilles, parties = workbook_parts(archive)
+        self.sheet_names = list(feuilles)
+        if isinstance(sheet_name, int):
+            sheet_name = self.sheet_names[sheet_name]
+        elif sheet_name not in feuilles:
+            raise KeyError(f"La feuille '{sheet_name}' n'existe pas dans le fichier.")
+        self.title = sheet_name
+        self._archive = archive
+        self._partie = feuilles[sheet_name]
+        self._dates, self._durees = _formats_dates(archive, parties.get(TYPE_RELATION_STYLES))
+        self._chaines = SharedStrings(archive, parties.get(TYPE_RELATION_CHAINES))
+        proprietes = ElementTree.fromstring(archive.read(parties[TYPE_RELATION_CLASSEUR])).find(
+            f'{{{SHEET_MAIN_NS}}}workbookPr')
+        mac = proprietes is not None and proprietes.get('date1904') in ('1', 'true')
+        self._epoque = CALENDAR_MAC_1904 if mac else CALENDAR_WINDOWS_1900
+
+    def _valeur(self, cellule):
+        type_ = cellule.get('t', 'n')
+        if type_ == 'inlineStr':
+            texte = cellule.find(BALISE_TEXTE_EN_LIGNE)
+            return None if texte is None else _texte(texte)
+        valeur = cellule.findtext(BALISE_VALEUR) or None
+        if valeur is None or type_ in ('str', 'e'):
+            return valeur
+        if type_ == 's':
+            return self._chaines[int(valeur)]
+        if type_ == 'b':
+            return bool(int(valeur))
+        if type_ == 'd':
+            return from_ISO8601(valeur)
+        nombre = float(valeur) if any(caractere in valeur for caractere in '.eE') else int(valeur)
+        style = int(cellule.get('s', 0))
+        if style in self._dates:
+            try:
+                return from_excel(nombre, self._epoque, timedelta=style in self._durees)
+            except (OverflowError, ValueError):
+                warnings.warn(f"Cellule {cellule.get('r')} : date hors limites, traitée comme une erreur")
+                return '#VALUE!'
+        return nombre
+
+    def rows(self, positions=None, min_row=1, max_row=None):
+        # Lignes (numéro Excel, valeurs) de `min_row` à `max_row`, les lignes absentes du fichier étant vides ;
+        # avec `positions` (indices de colonnes à partir de 0), les autres cellules restent à None sans être décodées
+        lettres = {}
+        numero, attendu = 0, min_row
+        with self._archive.open(self._partie) as flux:
+            for _, element in ElementTree.iterparse(flux):
+                if element.tag != BALISE_LIGNE:
+                    continue
+                numero = int(element.get('r', numero + 1))
+                if max_row is not None and numero > max_row:
+                    break
+                if numero < min_row:
+                    element.clear()
+                    continue
+                for attendu in range(attendu, numero):
+                    yield attendu, []
+
+                valeurs, position = [], -1
+                for cellule in element.iter(BALISE_CELLULE):
+                    ref = cellule.get('r')
+                    if ref is None:
+                        position += 1
+                    else:
+                        lettre = ref.rstrip(CHIFFRES)
+                        if lettre not in lettres:
+                            lettres[lettre] = column_index_from_string(lettre) - 1
+                        position = lettres[lettre]
+                    if positions is not None and position not in positions:
+                        continue
+                    valeurs.extend([None] * (position + 1 - len(valeurs)))
+                    valeurs[position] = self._valeur(cellule)
+                attendu = numero + 1
+                yield numero, valeurs
+                element.clear()
+
+
+def _convertir(valeur):
+    if valeur is None:
+        return np.nan
+    if isinstance(valeur, float) and valeur.is_integer():
+        return int(valeur)
+    if isinstance(valeur, str) and valeur in VALEURS_VIDES:
+        return np.nan
+    return valeur
+
+
+def _noms_colonnes(entete):
+    # Même nommage que pd.read_excel : 'Unnamed: i' pour les en-têtes vides, suffixe '.n' pour les doublons
+    noms, vus = [], {}
+    for i, valeur in enumerate(entete):
+        nom = f"Unnamed: {i}" if valeur is None else valeur
+        if nom in vus:
+            vus[nom] += 1
+            nom = f"{nom}.{vus[nom]}"
+        else:
+            vus[nom] = 0
+        noms.append(nom)
+    return noms
+
+
+def _lire_feuille(feuille, usecols=None):
+    # Les dimensions déclarées par certains outils sont fausses : la feuille est lue jusqu'à sa dernière ligne
+    lignes = feuille.rows(max_row=1)
+    entete = next(lignes, None)
+    lignes.close()
+    if entete is None:
+        return pd.DataFrame()
+
+    # Suppression des colonnes vides en fin d'en-tête
+    entete = entete[1]
+    while entete and entete[-1] is None:
+        entete.pop()
+    noms = _noms_colonnes(entete)
+
+    positions = list(range(len(noms)))
+    if usecols is not None:
+        positions = [i for i, nom in enumerate(noms) if nom in usecols]
+    colonnes = [[] for _ in positions]
+
+    # Seules les cellules des colonnes retenues sont décodées
+    nb_lignes = 0
+    derniere_non_vide = 0
+    for _, ligne in feuille.rows(positions=set(positions), min_row=2):
+        nb_lignes += 1
+        vide = True
+        for colonne, position in zip(colonnes, positions):
+            valeur = _convertir(ligne[position]) if position < len(ligne) else np.nan
+            if vide and not (isinstance(valeur, float) and np.isnan(valeur)):
+                vide = False
+            colonne.append(valeur)
+        if not vide:
+            derniere_non_vide = nb_lignes
+
+    # Les lignes vides en fin de feuille sont ignorées, comme avec pd.read_excel
+    return pd.DataFrame({noms[position]: colonne[:derniere_non_vide]
+                         for position, colonne in zip(positions, colonnes)})
+
+
+def read_sheet(source, sheet_name=0, usecols=None):
+    with _ouvrir(source) as archive:
+        return _lire_feuille(SheetReader(archive, sheet_name), usecols)
+
+
+def read_powerapp(source):
+    return read_sheet(source, FEUILLE_POWERAPP, usecols=COLONNES_POWERAPP)
+
+
+def read_source(source):
+    return read_sheet(source, 0)
+
+
+class LazySheets(MutableMapping, ABC):
+    # Feuilles lues au premier accès seulement ; les feuilles remplacées par affectation ne sont jamais lues.
+    # Les sous-classes fournissent `_lire(sheet_name)` et `close()`.
+
+    def __init__(self, sheet_names):
+        self.sheet_names = list(sheet_names)
+        self._feuilles = {}
+
+    @abstractmethod
+    def _lire(self, sheet_name):
+        ...
+
+    @abstractmethod
+    def close(self):
+        ...
+
+    def __getitem__(self, sheet_name):
+        if sheet_name not in self._feuilles:
+            if sheet_name not in self.sheet_names:
+                raise KeyError(sheet_name)
+            self._feuilles[sheet_name] = self._lire(sheet_name)
+        return self._feuilles[sheet_name]
+
+    def __setitem__(self, sheet_name, df):
+        if sheet_name not in self.sheet_names:
+            self.sheet_names.append(sheet_name)
+        self._feuilles[sheet_name] = df
+
+    def __delitem__(self, sheet_name):
+        self.sheet_names.remove(sheet_name)
+        self._feuilles.pop(sheet_name, None)
+
+    def __iter__(self):
+        return iter(list(self.sheet_names))
+
+    def __len__(self):
+        return len(self.sheet_names)
+
+    def __contains__(self, sheet_name):
+        return sheet_name in self.sheet_names
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ExcelWorkbook(LazySheets):
+    # Classeur xlsx dont les feuilles ne sont lues qu'au premier accès
+
+    def __init__(self, source):
+        self._archive = _ouvrir(source)
+        super().__init__(workbook_parts(self._archive)[0])
+
+    def _lire(self, sheet_name):
+        return _lire_feuille(SheetReader(self._archive, sheet_name))
+
+    def close(self):
+        self._archive.close()
+
+
+class ColumnarArchive(LazySheets):
+    # Tables d'une archive Parquet ou Arrow IPC (voir export_arrow), même interface qu'ExcelWorkbook :
+    # chaque table n'est lue qu'au premier accès
+
+    def __init__(self, source):
+        if isinstance(source, str):
+            with open(source, 'rb') as fichier:
+                source = fichier.read()
+        elif not isinstance(source, (bytes, bytearray)):
+            source = source.read()
+        self.format = archive_format(source)
+        if self.format is None:
+            raise ValueError("Le fichier n'est pas une archive de tables Parquet ou Arrow.")
+        self._archive = zipfile.ZipFile(BytesIO(source))
+        extension = EXTENSIONS[self.format]
+        super().__init__(nom[:-len(extension)] for nom in self._archive.namelist())
+
+    def _lire(self, sheet_name):
+        with self._archive.open(f"{sheet_name}{EXTENSIONS[self.format]}") as flux:
+            return read_columnar_table(BytesIO(flux.read()), self.format)
+
+    def close(self):
+        self._archive.close()
+
+
+def open_tables(contenu):
+    # Fichier transformé au format xlsx ou archive Parquet/Arrow, reconnu d'après son contenu
+    if archive_format(contenu) is not None:
+        return ColumnarArchive(contenu)
+    return ExcelWorkbook(contenu)
@@ -0,0 +1,112 @@
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+
+INTERVALLE_ECHANTILLONNAGE = 0.01
+
+logger = logging.getLogger('instrumentation')
+
+
+def rss_courant():
+    # RSS instantané du processus en octets (Linux) ; None si indisponible
+    try:
+        with open('/proc/self/statm') as fichier:
+            return int(fichier.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def count_rows(valeur):
+    if isinstance(valeur, (pd.DataFrame, pd.Series)):
+        return len(valeur)
+    if isinstance(valeur, dict):
+        lignes = [count_rows(v) for v in valeur.values()]
+        lignes = [n for n in lignes if n is not None]
+        return sum(lignes) if lignes else None
+    return None
+
+
+class Profiler:
+    # Mesures par étape : durée, temps CPU du thread, lignes en entrée et en sortie, pic de RSS.
+    # Un seul thread d'échantillonnage du RSS sert toutes les étapes en cours, même concurrentes.
+
+    def __init__(self, intervalle=INTERVALLE_ECHANTILLONNAGE):
+        self.records = []
+        self._intervalle = intervalle
+        self._verrou = threading.Lock()
+        self._pics = {}
+        self._arret = threading.Event()
+        self._echantillonneur = None
+
+    def _echantillonner(self):
+        while not self._arret.wait(self._intervalle):
+            rss = rss_courant()
+            if rss is None:
+                return
+            with self._verrou:
+                for cle, pic in self._pics.items():
+                    if rss > pic:
+                        self._pics[cle] = rss
+
+    def _demarrer_echantillonnage(self):
+        if self._echantillonneur is None and rss_courant() is not None:
+            self._echantillonneur = threading.Thread(target=self._echantillonner, daemon=True)
+            self._echantillonneur.start()
+
+    def close(self):
+        self._arret.set()
+        if self._echantillonneur is not None:
+            self._echantillonneur.join()
+
+    @contextmanager
+    def stage(self, nom, lignes_entree=None):
+        # Le dictionnaire renvoyé peut être complété (ex. 'lignes_sortie') avant la fin du bloc
+        self._demarrer_echantillonnage()
+        mesure = {'etape': nom, 'lignes_entree': lignes_entree, 'lignes_sortie': None}
+        cle = object()
+        rss_avant = rss_courant()
+        with self._verrou:
+            self._pics[cle] = rss_avant or 0
+        debut, debut_cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield mesure
+            mesure['statut'] = 'ok'
+        except Exception:
+            mesure['statut'] = 'erreur'
+            raise
+        finally:
+            mesure['duree_s'] = time.perf_counter() - debut
+            mesure['cpu_s'] = time.thread_time() - debut_cpu
+            rss_apres = rss_courant()
+            with self._verrou:
+                pic = max(self._pics.pop(cle), rss_apres or 0)
+            mesure['pic_rss_mo'] = None if rss_avant is None else (pic - rss_avant) / 2 ** 20
+            with self._verrou:
+                self.records.append(mesure)
+            logger.info(json.dumps(mesure, ensure_ascii=False))
+
+    def record(self, nom, fonction, *args, **kwargs):
+        lignes = [count_rows(arg) for arg in args]
+        lignes = [n for n in lignes if n is not None]
+        with self.stage(nom, sum(lignes) if lignes else None) as mesure:
+            resultat = fonction(*args, **kwargs)
+            mesure['lignes_sortie'] = count_rows(resultat)
+        return resultat
+
+    def to_frame(self):
+        colonnes = ['etape', 'statut', 'duree_s', 'cpu_s', 'lignes_entree', 'lignes_sortie', 'pic_rss_mo']
+        return pd.DataFrame(self.records, columns=colonnes)
+
+    def to_json(self):
+        return json.dumps(self.records, ensure_ascii=False, indent=2)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,67 @@
+import logging
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+# Étape du graphe : `function` est appelée avec les valeurs nommées dans `inputs`
+# (entrées du graphe ou résultats d'autres étapes) et son résultat est publié sous `name`
+Stage = namedtuple('Stage', ['name', 'function', 'inputs'])
+
+EXECUTEURS = {'thread': ThreadPoolExecutor, 'process': ProcessPoolExecutor}
+
+
+def prune_stages(stages, inputs, targets):
+    # Étapes nécessaires au calcul des cibles, dans l'ordre de déclaration
+    par_nom = {stage.name: stage for stage in stages}
+    necessaires = set()
+    a_visiter = list(targets)
+    while a_visiter:
+        nom = a_visiter.pop()
+        if nom in necessaires or nom in inputs:
+            continue
+        if nom not in par_nom:
+            raise ValueError(f"Aucune étape ni entrée ne produit '{nom}'")
+        necessaires.add(nom)
+        a_visiter.extend(par_nom[nom].inputs)
+    return [stage for stage in stages if stage.name in necessaires]
+
+
+def run_dag(stages, inputs, targets, max_workers=None, executor='thread', profiler=None, progress=None):
+    # Exécute les étapes dès que leurs dépendances sont disponibles ; les étapes
+    # indépendantes tournent en parallèle. Les étapes ne doivent pas modifier leurs entrées.
+    # `progress(nom, terminees, total)` est appelée à la fin de chaque étape.
+    if profiler is not None and executor != 'thread':
+        raise ValueError("Le profilage des étapes n'est disponible qu'avec l'exécuteur 'thread'")
+    stages = prune_stages(stages, inputs, targets)
+    valeurs = dict(inputs)
+    en_attente = {stage.name: stage for stage in stages}
+    en_cours = {}
+
+    with EXECUTEURS[executor](max_workers=max_workers) as pool:
+        while en_attente or en_cours:
+            prets = [stage for stage in en_attente.values() if all(nom in valeurs for nom in stage.inputs)]
+            if not prets and not en_cours:
+                raise ValueError(f"Dépendances circulaires entre les étapes : {sorted(en_attente)}")
+            for stage in prets:
+                del en_attente[stage.name]
+                logging.info(f"Lancement de l'étape {stage.name}")
+                arguments = [valeurs[nom] for nom in stage.inputs]
+                if profiler is not None:
+                    future = pool.submit(profiler.record, stage.function.__name__, stage.function, *arguments)
+                else:
+                    future = pool.submit(stage.function, *arguments)
+                en_cours[future] = stage
+
+            termines, _ = wait(en_cours, return_when=FIRST_COMPLETED)
+            for future in termines:
+                stage = en_cours.pop(future)
+                try:
+                    valeurs[stage.name] = future.result()
+                except Exception:
+                    for autre in en_cours:
+                        autre.cancel()
+                    raise
+                logging.info(f"Fin de l'étape {stage.name}")
+                if progress is not None:
+                    progress(stage.name, len(stages) - len(en_attente) - len(en_cours), len(stages))
+
+    return {nom: valeurs[nom] for nom in targets}
@@ -0,0 +1,158 @@
+import logging
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from similarite import normalize_text, normalize_texts
+
+LIMITE_PAR_DEFAUT = 50
+MODES_RECHERCHE = ('prefixe', 'contient')
+# La recherche par sous-chaîne parcourt les clés par blocs et s'arrête dès que la limite est atteinte
+TAILLE_BLOC_RECHERCHE = 16_384
+
+# Index inversés : nom -> (table, colonne clé, colonne valeur)
+INDEX_INVERSES = {
+    'rapports_par_data': ('Table_Rapport_Data', 'DATA', 'Nom du rapport'),
+    'data_par_rapport': ('Table_Rapport_Data', 'Nom du rapport', 'DATA'),
+    'prompts_par_rapport': ('Table_Rapport_Prompt', 'Nom du rapport', 'Prompt'),
+    'rapports_par_po': ('Table_Rapport', 'PO Data', 'Nom du rapport'),
+    'data_par_famille': ('Table_DATA', 'Famille donnée', 'DATA'),
+}
+
+
+class InvertedIndex:
+    # Clé -> valeurs distinctes associées, dans l'ordre d'apparition. Les associations sont rangées
+    # par clé dans un tableau de codes (une tranche par clé) : aucun objet Python n'est créé par ligne.
+
+    def __init__(self, cles, valeurs):
+        codes_cles, cles = pd.factorize(pd.Series(cles).astype(object))
+        codes_valeurs, valeurs = pd.factorize(pd.Series(valeurs).astype(object))
+        valides = (codes_cles >= 0) & (codes_valeurs >= 0)
+        codes_cles, codes_valeurs = codes_cles[valides], codes_valeurs[valides]
+
+        # Première occurrence de chaque couple (clé, valeur)
+        couples = codes_cles.astype(np.int64) * max(len(valeurs), 1) + codes_valeurs
+        _, premiers = np.unique(couples, return_index=True)
+        premiers.sort()
+        codes_cles, codes_valeurs = codes_cles[premiers], codes_valeurs[premiers]
+
+        ordre = np.argsort(codes_cles, kind='stable')
+        self._codes = codes_valeurs[ordre]
+        self._debuts = np.searchsorted(codes_cles[ordre], np.arange(len(cles) + 1))
+        self._positions = dict(zip(cles, range(len(cles))))
+        self._valeurs = np.asarray(valeurs, dtype=object)
+
+    def get(self, cle):
+        position = self._positions.get(cle)
+        if position is None:
+            return []
+        return self._valeurs[self._codes[self._debuts[position]:self._debuts[position + 1]]].tolist()
+
+    def keys(self):
+        return list(self._positions)
+
+    def __len__(self):
+        return len(self._positions)
+
+
+class KeySearch:
+    # Recherche par préfixe (dichotomie sur les clés normalisées triées) ou par sous-chaîne
+    # (balayage vectorisé des clés normalisées) ; la casse, les accents et la ponctuation sont ignorés
+
+    def __init__(self, cles):
+        cles = pd.unique(pd.Series(cles, dtype=object).dropna())
+        normalises = pa.array(normalize_texts(cles), type=pa.large_string())
+        ordre = pc.sort_indices(normalises).to_numpy()
+        self.cles = cles[ordre]
+        self._normalises = normalises.take(ordre)
+        self._tries = np.asarray(self._normalises.to_pylist(), dtype=object)
+
+    def search(self, motif, mode='prefixe', limite=LIMITE_PAR_DEFAUT):
+        if mode not in MODES_RECHERCHE:
+            raise ValueError(f"Mode de recherche inconnu '{mode}' (attendu : {', '.join(MODES_RECHERCHE)})")
+        motif = normalize_text(motif)
+        if not motif:
+            return self.cles[:limite].tolist()
+        if mode == 'prefixe':
+            debut = np.searchsorted(self._tries, motif, side='left')
+            fin = np.searchsorted(self._tries, motif + '\U0010ffff', side='left')
+            return self.cles[debut:min(fin, debut + limite)].tolist()
+
+        trouves = []
+        for debut in range(0, len(self.cles), TAILLE_BLOC_RECHERCHE):
+            bloc = self._normalises.slice(debut, TAILLE_BLOC_RECHERCHE)
+            positions = np.flatnonzero(pc.match_substring(bloc, motif).to_numpy(zero_copy_only=False))
+            trouves.extend(self.cles[debut + positions[:limite - len(trouves)]].tolist())
+            if len(trouves) >= limite:
+                break
+        return trouves
+
+    def __len__(self):
+        return len(self.cles)
+
+
+class DictionaryIndex:
+    # Index de recherche construit une fois à partir des tables produites par main_etl
+    # (dict, ExcelWorkbook ou ColumnarArchive) ; chaque consultation est une lecture de dictionnaire
+
+    def __init__(self, tables):
+        logging.info("Construction de l'index de recherche")
+        self.index = {}
+        for nom, (table, colonne_cle, colonne_valeur) in INDEX_INVERSES.items():
+            if table in tables and {colonne_cle, colonne_valeur} <= set(tables[table].columns):
+                self.index[nom] = InvertedIndex(tables[table][colonne_cle], tables[table][colonne_valeur])
+            else:
+                logging.info(f"Index {nom} vide : colonnes {colonne_cle}/{colonne_valeur} absentes de {table}")
+                self.index[nom] = InvertedIndex([], [])
+
+        # Fiche de chaque DATA : première ligne de Table_DATA
+        self._fiches = pd.DataFrame()
+        if 'Table_DATA' in tables and 'DATA' in tables['Table_DATA'].columns:
+            self._fiches = tables['Table_DATA'].dropna(subset=['DATA']).drop_duplicates('DATA').set_index('DATA', drop=False)
+
+        self.recherche_data = KeySearch(self._colonne(tables, 'DATA', ('Table_DATA', 'Table_Rapport_Data')))
+        self.recherche_rapports = KeySearch(self._colonne(tables, 'Nom du rapport',
+                                                          ('Table_Rapport', 'Table_Rapport_Data', 'Table_Rapport_Prompt')))
+        logging.info(f"Index de recherche prêt : {len(self.recherche_data)} DATA, {len(self.recherche_rapports)} rapports")
+
+    @staticmethod
+    def _colonne(tables, colonne, noms_tables):
+        valeurs = [tables[nom][colonne].astype(object) for nom in noms_tables
+                   if nom in tables and colonne in tables[nom].columns]
+        return pd.concat(valeurs, ignore_index=True) if valeurs else pd.Series([], dtype=object)
+
+    def reports_for_data(self, data):
+        return self.index['rapports_par_data'].get(data)
+
+    def data_for_report(self, rapport):
+        return self.index['data_par_rapport'].get(rapport)
+
+    def prompts_for_report(self, rapport):
+        return self.index['prompts_par_rapport'].get(rapport)
+
+    def reports_for_po(self, po):
+        return self.index['rapports_par_po'].get(po)
+
+    def data_for_family(self, famille):
+        return self.index['data_par_famille'].get(famille)
+
+    def data_details(self, data):
+        # Colonnes de Table_DATA pour cette DATA, None si elle n'y figure pas
+        if data not in self._fiches.index:
+            return None
+        fiche = self._fiches.loc[data]
+        return {colonne: None if pd.isna(valeur) else valeur for colonne, valeur in fiche.items()}
+
+    def search_data(self, motif, mode='prefixe', limite=LIMITE_PAR_DEFAUT):
+        return self.recherche_data.search(motif, mode, limite)
+
+    def search_reports(self, motif, mode='prefixe', limite=LIMITE_PAR_DEFAUT):
+        return self.recherche_rapports.search(motif, mode, limite)
+
+    def po_names(self):
+        return sorted(self.index['rapports_par_po'].keys(), key=str)
+
+    def families(self):
+        return sorted(self.index['data_par_famille'].keys(), key=str)
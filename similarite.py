@@ -0,0 +1,325 @@
+import itertools
+import logging
+import os
+import re
+import threading
+import unicodedata
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+COLONNE_DESCRIPTIF = 'Descriptif de la donnée'
+COLONNE_SIMILAIRES = 'données similaires'
+
+# Mode approché : similarité de Jaccard estimée par MinHash sur les trigrammes de caractères
+NB_PERMUTATIONS = 64
+TAILLE_TRIGRAMME = 3
+SEUIL_PAR_DEFAUT = 0.6
+# Écart entre le seuil demandé et le seuil implicite des bandes LSH, pour ne pas perdre de candidats
+MARGE_LSH = 0.1
+# Seuil le plus bas proposé : en dessous, les bandes de LIGNES_MIN_PAR_BANDE lignes perdent trop de candidats
+SEUIL_MINIMAL = 0.5
+LIGNES_MIN_PAR_BANDE = 3
+TAILLE_MAX_SEAU = 200
+TAILLE_BLOC_PAIRES = 100_000
+# Signatures conservées par l'index partagé (64 permutations : 256 octets par signature)
+TAILLE_INDEX_PAR_DEFAUT = 200_000
+
+SEPARATEURS_RE = re.compile(r'[\W_]+')
+# Équivalents RE2 (pyarrow) : marques diacritiques, puis tout ce qui n'est ni lettre ni chiffre
+DIACRITIQUES_ARROW = r'\p{Mn}'
+SEPARATEURS_ARROW = r'[^\p{L}\p{N}]+'
+
+
+def build_descriptif_index(df_data):
+    # Index descriptif -> liste des DATA uniques, dans l'ordre d'apparition
+    paires = df_data[[COLONNE_DESCRIPTIF, 'DATA']].dropna(subset=[COLONNE_DESCRIPTIF]).drop_duplicates()
+    return paires.groupby(COLONNE_DESCRIPTIF, sort=False)['DATA'].agg(list)
+
+
+def similar_data_column(df_data, index=None):
+    if index is None:
+        index = build_descriptif_index(df_data)
+
+    # Pour chaque groupe, chaque DATA reçoit la liste des autres DATA du groupe
+    descriptifs, datas, similaires = [], [], []
+    for descriptif, membres in index.items():
+        if len(membres) == 1:
+            continue
+        for i, data in enumerate(membres):
+            descriptifs.append(descriptif)
+            datas.append(data)
+            similaires.append(', '.join(membres[:i] + membres[i + 1:]))
+
+    if not similaires:
+        return pd.Series('', index=df_data.index, name=COLONNE_SIMILAIRES, dtype=object)
+
+    correspondances = pd.DataFrame({
+        COLONNE_DESCRIPTIF: descriptifs,
+        'DATA': datas,
+        COLONNE_SIMILAIRES: similaires,
+    })
+
+    # Rattachement aux lignes d'origine en une seule jointure
+    resultat = pd.merge(
+        df_data[[COLONNE_DESCRIPTIF, 'DATA']].reset_index(drop=True),
+        correspondances,
+        on=[COLONNE_DESCRIPTIF, 'DATA'],
+        how='left',
+    )
+    colonne = resultat[COLONNE_SIMILAIRES].fillna('').astype(object)
+    colonne.index = df_data.index
+    return colonne
+
+
+def normalize_text(texte):
+    # Minuscules, sans accents ni ponctuation, espaces simples
+    texte = unicodedata.normalize('NFKD', str(texte).lower())
+    texte = ''.join(caractere for caractere in texte if not unicodedata.combining(caractere))
+    return SEPARATEURS_RE.sub(' ', texte).strip()
+
+
+def normalize_texts(textes):
+    # Même normalisation que normalize_text, appliquée en une passe vectorisée à toute une liste
+    textes = pa.array([str(texte) for texte in textes], type=pa.large_string())
+    textes = pc.utf8_normalize(pc.utf8_lower(textes), 'NFKD')
+    textes = pc.replace_substring_regex(textes, DIACRITIQUES_ARROW, '')
+    textes = pc.replace_substring_regex(textes, SEPARATEURS_ARROW, ' ')
+    return pc.utf8_trim(textes, ' ').to_pylist()
+
+
+def shingles(texte, taille=TAILLE_TRIGRAMME):
+    texte = f" {texte} "
+    return {texte[i:i + taille] for i in range(max(1, len(texte) - taille + 1))}
+
+
+class MinHashIndex:
+    # Signatures MinHash des textes normalisés, rangées par empreinte du texte : d'une exécution
+    # à l'autre, seules les signatures des textes nouveaux ou modifiés sont calculées.
+    # Au-delà de `max_entries` signatures, les moins récemment utilisées sont évincées.
+    # Persistance optionnelle dans un fichier .npz.
+
+    def __init__(self, nb_permutations=NB_PERMUTATIONS, seed=0, path=None, max_entries=TAILLE_INDEX_PAR_DEFAUT):
+        rng = np.random.default_rng(seed)
+        self.nb_permutations = nb_permutations
+        self.path = path
+        self.max_entries = max_entries
+        self._a = rng.integers(1, 2 ** 63, nb_permutations, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2 ** 63, nb_permutations, dtype=np.uint64)
+        # Tableaux à capacité doublée au besoin : seules les `_taille` premières lignes sont occupées
+        self._positions = {}
+        self._taille = 0
+        self._cles = np.empty(0, dtype=np.uint64)
+        self._signatures = np.empty((0, nb_permutations), dtype=np.uint32)
+        self._utilisations = np.empty(0, dtype=np.int64)
+        self._generation = 0
+        self._verrou = threading.Lock()
+        if path and os.path.exists(path):
+            self._charger(path)
+
+    def _charger(self, path):
+        try:
+            with np.load(path) as fichier:
+                if np.array_equal(fichier['a'], self._a) and np.array_equal(fichier['b'], self._b):
+                    # Les dernières signatures rangées sont les plus récentes
+                    debut = 0 if self.max_entries is None else max(0, len(fichier['cles']) - self.max_entries)
+                    self._ajouter(fichier['cles'][debut:], fichier['signatures'][debut:])
+                else:
+                    logging.info(f"Index de similarité {path} calculé avec d'autres paramètres : ignoré")
+        except Exception as e:
+            logging.warning(f"Index de similarité illisible {path} : {e}")
+
+    def save(self, path=None):
+        path = path or self.path
+        temporaire = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with self._verrou:
+            cles, signatures = self._cles[:self._taille].copy(), self._signatures[:self._taille].copy()
+        try:
+            with open(temporaire, 'wb') as fichier:
+                np.savez(fichier, a=self._a, b=self._b, cles=cles, signatures=signatures)
+            os.replace(temporaire, path)
+        except Exception as e:
+            logging.warning(f"Impossible d'écrire l'index de similarité {path} : {e}")
+            if os.path.exists(temporaire):
+                os.remove(temporaire)
+
+    def _ajouter(self, cles, signatures):
+        # Range de nouvelles signatures à la suite et renvoie leurs positions
+        fin = self._taille + len(cles)
+        if fin > len(self._cles):
+            capacite = max(fin, 2 * len(self._cles))
+            for nom in ('_cles', '_signatures', '_utilisations'):
+                ancien = getattr(self, nom)
+                tableau = np.empty((capacite,) + ancien.shape[1:], dtype=ancien.dtype)
+                tableau[:self._taille] = ancien[:self._taille]
+                setattr(self, nom, tableau)
+        positions = np.arange(self._taille, fin)
+        self._cles[positions] = cles
+        self._signatures[positions] = signatures
+        self._utilisations[positions] = self._generation
+        self._positions.update(zip(cles.tolist(), positions.tolist()))
+        self._taille = fin
+        return positions
+
+    def _evincer(self):
+        # Ne garde que les trois quarts de `max_entries`, les plus récemment utilisées (dont celles de
+        # l'appel en cours) : le compactage, qui copie tout l'index, reste rare
+        if self.max_entries is None or self._taille <= self.max_entries:
+            return
+        utilisations = self._utilisations[:self._taille]
+        nb_gardees = max(self.max_entries * 3 // 4, int((utilisations == self._generation).sum()))
+        gardees = np.sort(np.argsort(-utilisations, kind='stable')[:nb_gardees])
+        logging.info(f"Index de similarité : {self._taille - nb_gardees} signatures évincées")
+        self._cles = self._cles[gardees]
+        self._signatures = self._signatures[gardees]
+        self._utilisations = utilisations[gardees]
+        self._taille = nb_gardees
+        self._positions = dict(zip(self._cles.tolist(), range(nb_gardees)))
+
+    def _calculer(self, textes):
+        # Une passe vectorisée par permutation : minimum par texte des trigrammes hachés et permutés
+        trigrammes = [shingles(texte) for texte in textes]
+        longueurs = np.fromiter(map(len, trigrammes), dtype=np.int64, count=len(trigrammes))
+        hashes = pd.util.hash_array(np.fromiter(itertools.chain.from_iterable(trigrammes), dtype=object,
+                                                count=int(longueurs.sum())))
+        debuts = np.cumsum(longueurs) - longueurs
+        signatures = np.empty((len(textes), self.nb_permutations), dtype=np.uint32)
+        for permutation, (a, b) in enumerate(zip(self._a, self._b)):
+            valeurs = ((hashes * a + b) >> np.uint64(32)).astype(np.uint32)
+            signatures[:, permutation] = np.minimum.reduceat(valeurs, debuts)
+        return signatures
+
+    def signatures(self, textes):
+        # `textes` : textes normalisés distincts ; renvoie une signature par texte. Le coût dépend
+        # du nombre de textes demandés, pas de la taille de l'index.
+        textes = np.asarray(textes, dtype=object)
+        cles = pd.util.hash_array(textes)
+        with self._verrou:
+            self._generation += 1
+            positions = np.fromiter((self._positions.get(cle, -1) for cle in cles.tolist()),
+                                    dtype=np.int64, count=len(cles))
+            nouveaux = positions < 0
+            if nouveaux.any():
+                logging.info(f"Calcul de {nouveaux.sum()} signatures MinHash ({len(textes) - nouveaux.sum()} reprises de l'index)")
+                positions[nouveaux] = self._ajouter(cles[nouveaux], self._calculer(textes[nouveaux]))
+            self._utilisations[positions] = self._generation
+            signatures = self._signatures[positions]
+            self._evincer()
+            return signatures
+
+    def __len__(self):
+        return self._taille
+
+
+def _lignes_par_bande(nb_permutations, seuil):
+    # Plus grandes bandes dont le seuil implicite (1/b)^(1/r) reste sous `seuil - MARGE_LSH`, sans descendre
+    # sous LIGNES_MIN_PAR_BANDE : des bandes plus étroites font collisionner trop de textes sans rapport
+    lignes = LIGNES_MIN_PAR_BANDE
+    for r in range(LIGNES_MIN_PAR_BANDE, nb_permutations + 1):
+        if (1 / (nb_permutations // r)) ** (1 / r) <= seuil - MARGE_LSH:
+            lignes = r
+    return lignes
+
+
+def _paires_candidates(cles):
+    # Paires (i, j), i < j, de textes de même clé de bande, produites par décalage croissant dans l'ordre
+    # trié des clés : chaque lot compte au plus un élément par texte, quelle que soit la taille des seaux.
+    # Dans un seau de plus de TAILLE_MAX_SEAU textes, chacun n'est comparé qu'aux TAILLE_MAX_SEAU suivants.
+    ordre = np.argsort(cles, kind='stable')
+    triees = cles[ordre]
+    debuts = np.flatnonzero(np.r_[True, triees[1:] != triees[:-1]])
+    fins = np.repeat(np.r_[debuts[1:], len(triees)], np.diff(np.r_[debuts, len(triees)]))
+    suivants = np.minimum(fins - np.arange(len(triees)) - 1, TAILLE_MAX_SEAU)
+    actifs = np.flatnonzero(suivants)
+    decalage = 1
+    while len(actifs):
+        yield ordre[actifs], ordre[actifs + decalage]
+        decalage += 1
+        actifs = actifs[suivants[actifs] >= decalage]
+
+
+def near_duplicate_pairs(signatures, seuil):
+    # Paires (i, j), i < j, dont la similarité estimée atteint `seuil`. Seuls les textes partageant
+    # une bande de signature entière sont comparés : pas de comparaison de toutes les paires.
+    nb_textes, nb_permutations = signatures.shape
+    lignes = _lignes_par_bande(nb_permutations, seuil)
+    gardes = np.empty(0, dtype=np.int64)
+    for debut in range(0, nb_permutations - lignes + 1, lignes):
+        cles = pd.util.hash_pandas_object(pd.DataFrame(signatures[:, debut:debut + lignes]), index=False).to_numpy()
+        retenues = [gardes]
+        # Vérification lot par lot : seules les paires retenues sont conservées en mémoire
+        for i, j in _paires_candidates(cles):
+            for bloc in range(0, len(i), TAILLE_BLOC_PAIRES):
+                i_bloc, j_bloc = i[bloc:bloc + TAILLE_BLOC_PAIRES], j[bloc:bloc + TAILLE_BLOC_PAIRES]
+                similaires = (signatures[i_bloc] == signatures[j_bloc]).mean(axis=1) >= seuil
+                retenues.append(i_bloc[similaires] * nb_textes + j_bloc[similaires])
+        gardes = np.unique(np.concatenate(retenues))
+    return gardes // nb_textes, gardes % nb_textes
+
+
+def near_duplicate_column(df_data, seuil=SEUIL_PAR_DEFAUT, index=None):
+    # Données similaires exactes (même descriptif), complétées par les DATA dont le descriptif
+    # et le nom normalisés sont proches au sens de MinHash/LSH
+    if index is None:
+        index = MinHashIndex()
+
+    presents = df_data[COLONNE_DESCRIPTIF].notna().to_numpy()
+    descriptifs = df_data[COLONNE_DESCRIPTIF].to_numpy(dtype=object)[presents]
+    datas = df_data['DATA'].to_numpy(dtype=object)[presents]
+
+    # DATA distinctes par descriptif identique, dans l'ordre d'apparition
+    exactes = {}
+    for descriptif, data in zip(descriptifs, datas):
+        exactes.setdefault(descriptif, {})[data] = None
+
+    # Document comparé : descriptif et DATA normalisés, chaque texte distinct n'étant normalisé qu'une fois
+    textes = list(dict.fromkeys(itertools.chain(exactes, (data for data in datas if isinstance(data, str)))))
+    normalises = dict(zip(textes, normalize_texts(textes)))
+    documents = pd.Series([f"{normalises[descriptif]} {normalises.get(data, '')}"
+                           for descriptif, data in zip(descriptifs, datas)], dtype=object)
+    codes, uniques = pd.factorize(documents)
+
+    # Voisins de chaque document (lui compris), dans l'ordre d'apparition
+    i, j = near_duplicate_pairs(index.signatures(uniques), seuil)
+    voisins = [[document] for document in range(len(uniques))]
+    for document, voisin in zip(np.concatenate([i, j]).tolist(), np.concatenate([j, i]).tolist()):
+        voisins[document].append(voisin)
+    for liste in voisins:
+        liste.sort()
+
+    # DATA distinctes de chaque document, dans l'ordre d'apparition
+    datas_documents = [{} for _ in range(len(uniques))]
+    for code, data in zip(codes.tolist(), datas):
+        datas_documents[code][data] = None
+
+    valeurs = []
+    for descriptif, data, code in zip(descriptifs, datas, codes.tolist()):
+        vues = {data}
+        similaires = []
+        candidats = itertools.chain(exactes[descriptif],
+                                    *(datas_documents[voisin] for voisin in voisins[code]))
+        for candidat in candidats:
+            if isinstance(candidat, str) and candidat not in vues:
+                vues.add(candidat)
+                similaires.append(candidat)
+        valeurs.append(', '.join(similaires))
+
+    colonne = pd.Series('', index=df_data.index, name=COLONNE_SIMILAIRES, dtype=object)
+    colonne.iloc[np.flatnonzero(presents)] = valeurs
+    return colonne
+
+
+def process_similar_data(df_data, seuil=None, index=None):
+    logging.info("Début du traitement des données similaires")
+
+    # Création de la colonne contenant les Données Similaires : descriptifs identiques,
+    # ou proches au-delà de `seuil` (mode approché) quand un seuil est donné
+    if seuil is None:
+        df_data[COLONNE_SIMILAIRES] = similar_data_column(df_data)
+    else:
+        df_data[COLONNE_SIMILAIRES] = near_duplicate_column(df_data, seuil, index)
+
+    logging.info("Fin du traitement des données similaires")
+    return df_data
@@ -0,0 +1,95 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+TACHES_PAR_DEFAUT = min(4, os.cpu_count() or 1)
+TTL_TACHES_PAR_DEFAUT = 3600
+
+
+class Job:
+    # Tâche soumise au pool : la fonction reçoit la tâche en premier argument
+    # et publie son avancement avec `report`
+
+    def __init__(self, nom):
+        self.id = uuid.uuid4().hex
+        self.nom = nom
+        self.progression = 0.0
+        self.message = "En file d'attente"
+        self.debut = None
+        self.fin = None
+        self.future = None
+
+    def report(self, progression, message):
+        self.progression = min(max(progression, 0.0), 1.0)
+        self.message = message
+
+    def running(self):
+        return self.debut is not None and self.fin is None
+
+    def done(self):
+        return self.future is not None and self.future.done()
+
+    def result(self):
+        # Relève l'exception de la tâche si elle a échoué
+        return self.future.result()
+
+
+class JobManager:
+    # Pool borné partagé par toutes les sessions : au-delà de `max_workers` tâches
+    # simultanées, les suivantes attendent leur tour. Les tâches terminées et jamais
+    # récupérées sont oubliées après `ttl_seconds`.
+
+    def __init__(self, max_workers=TACHES_PAR_DEFAUT, ttl_seconds=TTL_TACHES_PAR_DEFAUT):
+        self.max_workers = max_workers
+        self.ttl_seconds = ttl_seconds
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='tache')
+        self._taches = {}
+        self._verrou = threading.Lock()
+
+    def _executer(self, job, fonction, *args):
+        job.debut = time.time()
+        job.report(0.0, "Démarrage")
+        logging.info(f"Début de la tâche {job.nom} ({job.id})")
+        try:
+            resultat = fonction(job, *args)
+        except Exception:
+            logging.exception(f"Échec de la tâche {job.nom} ({job.id})")
+            raise
+        finally:
+            job.fin = time.time()
+        job.report(1.0, "Terminé")
+        logging.info(f"Fin de la tâche {job.nom} ({job.id}) en {job.fin - job.debut:.1f} s")
+        return resultat
+
+    def _purger(self):
+        limite = time.time() - self.ttl_seconds
+        for identifiant, job in list(self._taches.items()):
+            if job.fin is not None and job.fin < limite:
+                del self._taches[identifiant]
+
+    def submit(self, nom, fonction, *args):
+        job = Job(nom)
+        with self._verrou:
+            self._purger()
+            self._taches[job.id] = job
+        job.future = self._pool.submit(self._executer, job, fonction, *args)
+        return job.id
+
+    def get(self, identifiant):
+        with self._verrou:
+            return self._taches.get(identifiant)
+
+    def pop(self, identifiant):
+        with self._verrou:
+            return self._taches.pop(identifiant, None)
+
+    def pending(self):
+        # Nombre de tâches soumises qui n'ont pas encore démarré
+        with self._verrou:
+            return sum(1 for job in self._taches.values() if job.debut is None)
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait)
@@ -0,0 +1,199 @@
+import difflib
+import logging
+import zipfile
+from collections import namedtuple
+from datetime import date, time, timedelta
+from io import BytesIO
+from xml.etree import ElementTree
+
+from openpyxl.utils import get_column_letter
+
+from export_arrow import EXTENSIONS, archive_format, read_columnar_columns
+from export_excel import workbook_parts
+from ingestion import COLONNES_POWERAPP, COLONNES_SOURCE, FEUILLE_POWERAPP, VALEURS_VIDES, SheetReader
+from similarite import normalize_text
+
+# Lignes lues après l'en-tête pour contrôler les types : le reste du fichier n'est pas décodé
+TAILLE_ECHANTILLON = 1_000
+# Au-delà, les lignes en erreur d'une même colonne sont résumées en un seul problème
+LIGNES_PAR_COLONNE = 10
+
+# Contrôles par colonne : None (présence seule), 'texte' (texte ou nombre, éventuellement vide),
+# 'obligatoire' (texte non vide : les identifiants sont calculés à partir de ce texte),
+# 'facultatif' (colonne reprise si elle existe : son absence est signalée dans le journal sans bloquer)
+TEXTE = 'texte'
+OBLIGATOIRE = 'obligatoire'
+FACULTATIF = 'facultatif'
+
+# Problème détecté : `ligne` est le numéro de ligne Excel (1 = en-tête), None pour un problème de feuille ou d'en-tête
+Probleme = namedtuple('Probleme', ['fichier', 'feuille', 'colonne', 'ligne', 'message'])
+
+Schema = namedtuple('Schema', ['fichier', 'feuille', 'colonnes'])
+
+SCHEMA_POWERAPP = Schema('Powerapp', FEUILLE_POWERAPP, {
+    **{colonne: FACULTATIF for colonne in COLONNES_POWERAPP},
+    'DATA': TEXTE,
+})
+SCHEMA_SOURCE = Schema('Source', 0, {
+    **{colonne: None for colonne in COLONNES_SOURCE},
+    'Nom du rapport': OBLIGATOIRE,
+    'KPI': TEXTE,
+    "Maille d'analyse": TEXTE,
+    'PO Data': OBLIGATOIRE,
+    'Ecran de sélection /prompt ': TEXTE,
+    'Axe temps du rapport': OBLIGATOIRE,
+})
+SCHEMA_TRANSFORME = Schema('Fichier transformé', 'Table_DATA', {'DATA': None, 'Descriptif de la donnée': None})
+
+
+class SchemaError(ValueError):
+    # Fichier rejeté avant traitement : `problemes` liste tous les problèmes détectés
+
+    def __init__(self, problemes):
+        self.problemes = list(problemes)
+        super().__init__('\n'.join(format_problem(probleme) for probleme in self.problemes))
+
+
+def format_problem(probleme):
+    position = [f"feuille '{probleme.feuille}'"] if probleme.feuille is not None else []
+    if probleme.colonne is not None:
+        position.append(f"colonne {probleme.colonne}")
+    if probleme.ligne is not None:
+        position.append(f"ligne {probleme.ligne}")
+    if not position:
+        return f"{probleme.fichier} : {probleme.message}"
+    return f"{probleme.fichier} ({', '.join(position)}) : {probleme.message}"
+
+
+def _vide(valeur):
+    return valeur is None or (isinstance(valeur, str) and (valeur in VALEURS_VIDES or not valeur.strip()))
+
+
+def _suggestion(colonne, entete):
+    # Colonne présente sous un nom voisin : espaces, casse ou accents différents, ou faute de frappe
+    noms = [nom for nom in entete if isinstance(nom, str)]
+    for nom in noms:
+        if normalize_text(nom) == normalize_text(colonne):
+            return f" ; colonne '{nom}' trouvée : vérifier les espaces, la casse et les accents"
+    proches = difflib.get_close_matches(colonne, noms, n=1, cutoff=0.8)
+    return f" ; colonne voisine : '{proches[0]}'" if proches else ''
+
+
+def _controler_entete(schema, feuille, entete):
+    problemes, positions = [], {}
+    for position, nom in enumerate(entete):
+        if nom in schema.colonnes:
+            if nom in positions:
+                problemes.append(Probleme(schema.fichier, feuille, f"{get_column_letter(position + 1)} '{nom}'", 1,
+                                          f"colonne en double (déjà en {get_column_letter(positions[nom] + 1)}) : "
+                                          "seule la première est lue"))
+            else:
+                positions[nom] = position
+    for colonne, controle in schema.colonnes.items():
+        if colonne in positions:
+            continue
+        if controle == FACULTATIF:
+            message = f"colonne facultative absente de la feuille '{feuille}'{_suggestion(colonne, entete)}"
+            logging.warning(format_problem(Probleme(schema.fichier, feuille, f"'{colonne}'", 1, message)))
+        else:
+            problemes.append(Probleme(schema.fichier, feuille, f"'{colonne}'", 1,
+                                      f"colonne obligatoire absente{_suggestion(colonne, entete)}"))
+    return problemes, positions
+
+
+def _controler_cellule(controle, valeur):
+    if controle == OBLIGATOIRE and _vide(valeur):
+        return "valeur obligatoire manquante"
+    if controle == OBLIGATOIRE and not isinstance(valeur, str):
+        return f"texte attendu, valeur de type {type(valeur).__name__} trouvée ({valeur!r})"
+    if controle == TEXTE and isinstance(valeur, (bool, date, time, timedelta)):
+        return f"texte attendu, valeur de type {type(valeur).__name__} trouvée ({valeur!r})"
+    return None
+
+
+def _controler_echantillon(schema, feuille, positions, lignes):
+    # Une liste de lignes en erreur par colonne et par message ; les lignes entièrement vides sont ignorées
+    erreurs = {}
+    controles = [(colonne, positions[colonne], controle) for colonne, controle in schema.colonnes.items()
+                 if controle in (TEXTE, OBLIGATOIRE) and colonne in positions]
+    for numero, ligne in lignes:
+        if all(_vide(valeur) for valeur in ligne):
+            continue
+        for colonne, position, controle in controles:
+            message = _controler_cellule(controle, ligne[position] if position < len(ligne) else None)
+            if message is not None:
+                erreurs.setdefault((colonne, position, message), []).append(numero)
+
+    problemes = []
+    for (colonne, position, message), numeros in erreurs.items():
+        nom = f"{get_column_letter(position + 1)} '{colonne}'"
+        for numero in numeros[:LIGNES_PAR_COLONNE]:
+            problemes.append(Probleme(schema.fichier, feuille, nom, numero, message))
+        if len(numeros) > LIGNES_PAR_COLONNE:
+            autres = numeros[LIGNES_PAR_COLONNE:]
+            problemes.append(Probleme(schema.fichier, feuille, nom, None,
+                                      f"{message} sur {len(autres)} autre(s) ligne(s) de l'échantillon "
+                                      f"({', '.join(map(str, autres[:LIGNES_PAR_COLONNE]))}...)"))
+    return problemes
+
+
+def validate_workbook(source, schema, taille_echantillon=TAILLE_ECHANTILLON):
+    # Lit en flux l'en-tête et les `taille_echantillon` premières lignes de la feuille attendue,
+    # sans décoder le reste du classeur ; renvoie la liste de tous les problèmes (vide si le fichier est valide)
+    if isinstance(source, (bytes, bytearray)):
+        source = BytesIO(source)
+    try:
+        with zipfile.ZipFile(source) as archive:
+            feuilles, _ = workbook_parts(archive)
+            noms = list(feuilles)
+            if isinstance(schema.feuille, int):
+                if len(noms) <= schema.feuille:
+                    return [Probleme(schema.fichier, None, None, None, "le classeur ne contient aucune feuille")]
+                feuille = noms[schema.feuille]
+            elif schema.feuille in feuilles:
+                feuille = schema.feuille
+            else:
+                proches = difflib.get_close_matches(schema.feuille, noms, n=1, cutoff=0.6)
+                indice = f" ; feuille voisine : '{proches[0]}'" if proches else ''
+                return [Probleme(schema.fichier, schema.feuille, None, None,
+                                 f"feuille absente (feuilles du classeur : {', '.join(noms)}){indice}")]
+            lignes = list(SheetReader(archive, feuille).rows(max_row=taille_echantillon + 1))
+    except (zipfile.BadZipFile, KeyError, IndexError, OSError, ValueError, ElementTree.ParseError) as e:
+        return [Probleme(schema.fichier, None, None, None, f"classeur Excel illisible ({e})")]
+
+    if not lignes or lignes[0][0] != 1 or all(_vide(valeur) for valeur in lignes[0][1]):
+        return [Probleme(schema.fichier, feuille, None, 1, "feuille vide : en-tête introuvable")]
+
+    problemes, positions = _controler_entete(schema, feuille, lignes[0][1])
+    problemes += _controler_echantillon(schema, feuille, positions, lignes[1:])
+    return problemes
+
+
+def validate_archive(contenu, schema):
+    # Archive Parquet/Arrow : seuls les schémas des tables sont lus
+    format = archive_format(contenu)
+    nom_table = f"{schema.feuille}{EXTENSIONS[format]}"
+    with zipfile.ZipFile(BytesIO(contenu)) as archive:
+        if nom_table not in archive.namelist():
+            tables = [nom[:-len(EXTENSIONS[format])] for nom in archive.namelist()]
+            return [Probleme(schema.fichier, schema.feuille, None, None,
+                             f"table absente (tables de l'archive : {', '.join(tables)})")]
+        with archive.open(nom_table) as flux:
+            colonnes = read_columnar_columns(BytesIO(flux.read()), format)
+    return _controler_entete(schema, schema.feuille, colonnes)[0]
+
+
+def validate_inputs(powerapp, source, taille_echantillon=TAILLE_ECHANTILLON):
+    # Contrôle des deux fichiers d'entrée de l'ETL ; tous les problèmes sont renvoyés ensemble
+    problemes = validate_workbook(powerapp, SCHEMA_POWERAPP, taille_echantillon)
+    problemes += validate_workbook(source, SCHEMA_SOURCE, taille_echantillon)
+    for probleme in problemes:
+        logging.warning(format_problem(probleme))
+    return problemes
+
+
+def validate_transformed(contenu):
+    # Fichier transformé déposé pour les données similaires : xlsx ou archive Parquet/Arrow
+    if archive_format(contenu) is not None:
+        return validate_archive(contenu, SCHEMA_TRANSFORME)
+    return validate_workbook(contenu, SCHEMA_TRANSFORME, taille_echantillon=0)